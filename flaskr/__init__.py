@@ -4,7 +4,6 @@
 
 import os
 import flask
-import json
 import flask_compress
 import flask_assets
 import flask_wtf
@@ -12,10 +11,16 @@ from datetime import datetime
 import traceback
 import dotenv
 import configparser
-import redis
 import flaskr.functions
 import flaskr.jinja_filters
 import flaskr.static_cache
+import flaskr.lazy_globals
+import flaskr.query_stats
+import flaskr.cache_sync
+import flaskr.page_cache
+import flaskr.products
+import flaskr.suggest
+import flaskr.catalog_filter
 import logging
 
 
@@ -26,6 +31,7 @@ config.read(f'{working_dir}/config.ini')
 
 
 app = flask.Flask(__name__, instance_relative_config=True)
+app.app_ctx_globals_class = flaskr.lazy_globals.LazyGlobals
 
 
 #logging setup
@@ -69,6 +75,7 @@ compress = flask_compress.Compress(app)
 app.jinja_env.filters['slugify'] = flaskr.jinja_filters.slugify
 app.jinja_env.filters['jsonify'] = flaskr.jinja_filters.jsonify
 app.jinja_env.filters['timestamp_to_date'] = flaskr.jinja_filters.timestamp_to_date
+app.jinja_env.globals['page_cache_hole'] = flaskr.page_cache.hole
 
 
 # app config
@@ -103,49 +110,45 @@ from . import cart
 app.register_blueprint(cart.bp)
 from . import order
 app.register_blueprint(order.bp)
+from . import stats
+app.register_blueprint(stats.bp)
 
 
-# load static data
+# load static data, reloaded in every worker when notify_static_data_changed() is called
 with app.app_context():
-    conn = flaskr.functions.connect_db()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM categories")
-    flaskr.static_cache.CATEGORIES = flaskr.functions.build_category_tree(cursor.fetchall())
-    with open(f'{working_dir}flaskr/json/errors.json', 'r') as f:
-        flaskr.static_cache.ERROR_MESSAGES = json.load(f)
-    with open(f'{working_dir}flaskr/json/successes.json', 'r') as f:
-        flaskr.static_cache.SUCCESS_MESSAGES = json.load(f)
-    cursor.close()
-    conn.close()
+    flaskr.functions.load_static_data()
+flaskr.cache_sync.register_handler('static_data', flaskr.functions.reload_static_data_if_changed, resync=flaskr.functions.reload_static_data_if_changed)
+flaskr.cache_sync.register_handler('page_cache', flaskr.page_cache.handle_page_cache_event)
+flaskr.cache_sync.register_handler('product_cache', flaskr.products.handle_cache_event, resync=flaskr.products.resync_cache)
+flaskr.cache_sync.register_handler('suggest', flaskr.suggest.handle_suggest_event, resync=flaskr.suggest.resync_index)
+flaskr.cache_sync.register_handler('catalog_filter', flaskr.catalog_filter.handle_filter_event, resync=flaskr.catalog_filter.resync_filter)
 
 
 @app.before_request
 def before_rq():
     if flask.request.host != config['APP']['server_name']:
         flask.abort(404)
-    try:
-        flask.g.conn = flaskr.functions.connect_db()
-        flask.g.cursor = flask.g.conn.cursor(dictionary=True)
-        flask.g.redis_client = redis.Redis(host=config['REDIS']['host'], port=config['REDIS']['port'], db=config['REDIS']['db'])
-        flaskr.functions.get_cart_products()
-    except Exception as e:
-        pass
+    flaskr.query_stats.start_request()
+    flaskr.cache_sync.ensure_listener()
+    #conn, cursor, redis_client and cart_products are opened lazily by flask.g on first access (see lazy_globals.py)
 
 
 @app.after_request
 def after_rq(response):
-    flaskr.functions.init_cart(response)
+    if flaskr.functions.is_exempt_request():
+        return response
+    flaskr.functions.set_cart_cookie(response)
+    flaskr.query_stats.finish_request(response)
     return response
 
 
 @app.teardown_request
 def teardown_request(exception):
-    if hasattr(flask.g, 'cursor'):
+    #"in" does not trigger lazy loading, only resources opened during the request are closed
+    if 'cursor' in flask.g:
         flask.g.cursor.close()
-    if hasattr(flask.g, 'conn'):
+    if 'conn' in flask.g:
        flask.g.conn.close()
-    if hasattr(flask.g, 'redis_client'):
-        flask.g.redis_client.close()
 
 
 @app.context_processor
@@ -174,6 +174,7 @@ def logout():
     if flask.session.get('user_id'):
         flaskr.functions.migrate_cart('user->cookie')
         flask.session.clear()
+        flaskr.functions.touch_cart_version()
         return flask.render_template('auth/logged_out.html')
     else:
         return flask.redirect('/')
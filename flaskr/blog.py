@@ -6,6 +6,7 @@ import os
 import flask
 import dotenv
 import configparser
+import flaskr.conditional
 import logging
 
 dotenv.load_dotenv()
@@ -20,5 +21,6 @@ bp = flask.Blueprint('blog', __name__, url_prefix=config['ENDPOINTS']['blog'])
 
 
 @bp.route('', methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('blog/main.html'))
 def main_blog():
     return flask.render_template('blog/main.html')
\ No newline at end of file
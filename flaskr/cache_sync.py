@@ -0,0 +1,93 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import json
+import time
+import threading
+import traceback
+import dotenv
+import configparser
+import flaskr.redis_pool
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+#event type -> function(payload) called in the listener thread of every worker
+HANDLERS = {}
+#event type -> function() called after every (re)subscribe, used to catch up on events missed while disconnected
+RESYNC_HANDLERS = {}
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def register_handler(event_type, handler, resync=None):
+    HANDLERS[event_type] = handler
+    if resync:
+        RESYNC_HANDLERS[event_type] = resync
+
+
+def publish(event_type, payload=None, version_key=None):
+    #optionally bumps version_key and publishes the new version together with the event in one round trip
+    channel = config['REDIS_QUEUES']['cache_sync_channel']
+    if version_key:
+        version = flaskr.redis_pool.run_pipeline([('incr', (version_key,))], transaction=True)[0]
+        payload = {**(payload or {}), 'version': version}
+    flaskr.redis_pool.get_client().publish(channel, json.dumps({'type': event_type, 'payload': payload}))
+    return payload
+
+
+def get_version(version_key):
+    return int(flaskr.redis_pool.get_client().get(version_key) or 0)
+
+
+def dispatch(data):
+    event = json.loads(data)
+    handler = HANDLERS.get(event['type'])
+    if handler:
+        handler(event['payload'])
+
+
+def listen():
+    while True:
+        pubsub = None
+        try:
+            pubsub = flaskr.redis_pool.get_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(config['REDIS_QUEUES']['cache_sync_channel'])
+            for resync in list(RESYNC_HANDLERS.values()):
+                resync()
+            for message in pubsub.listen():
+                try:
+                    dispatch(message['data'])
+                except Exception as e:
+                    logger.error(f'Cache sync event failed: {e}\n{traceback.format_exc()}')
+        except Exception as e:
+            logger.error(f'Cache sync listener disconnected: {e}')
+            time.sleep(int(config['CACHE_SYNC']['reconnect_delay']))
+        finally:
+            if pubsub:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def ensure_listener():
+    #one listener thread per worker process, started on first request so it also runs after gunicorn forks
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        threading.Thread(target=listen, name='cache-sync', daemon=True).start()
+        _listener_pid = os.getpid()
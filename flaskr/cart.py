@@ -8,7 +8,8 @@ import dotenv
 import configparser
 import json
 import flaskr.functions
-import time
+import flaskr.products
+import flaskr.cart_store
 import logging
 
 
@@ -30,36 +31,16 @@ def cart():
 @bp.route(config['ACTIONS']['add'], methods=['POST'])
 def add_to_cart():
     data = json.loads(flask.request.get_data().decode())
-    flask.g.cursor.execute('SELECT * FROM products WHERE id = %s', (data['productId'],))
-    product = flask.g.cursor.fetchone()
-    if product == None:
-        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['product_not_found']}, 404
-    elif data['amount'] < 1:
+    if data['amount'] < 1:
         return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['amount_too_low']}, 400
 
-    if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        cart_id = flask.g.cursor.fetchone()['id']
-    else:
-        flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (flask.request.cookies.get(config['COOKIE_NAMES']['cart']),))
-        cart_id = flask.g.cursor.fetchone()['id']
-
-    flask.g.cursor.execute('SELECT * FROM cartProducts WHERE productId = %s and cartId = %s', (data['productId'], cart_id))
-    cart_product = flask.g.cursor.fetchone()
-
-    if cart_product:
-        if (cart_product['amount'] + data['amount']) > product['stock']:
-            return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['not_enough_in_stock']}, 400
-        flask.g.cursor.execute('UPDATE cartProducts SET amount = amount + %s WHERE productId = %s and cartId = %s', (data['amount'], data['productId'], cart_id))
-        flask.g.conn.commit()
-    else:
-        if data['amount'] > product['stock']:
-            return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['not_enough_in_stock']}, 400
-        flask.g.cursor.execute('INSERT INTO cartProducts (productId, amount, cartId) VALUES (%s, %s, %s)', (data['productId'], data['amount'], cart_id))
-        flask.g.conn.commit()
-    
-    flask.g.cursor.execute('UPDATE carts SET lastModTime = %s WHERE id = %s', (int(time.time()), cart_id))
-    flask.g.conn.commit()
+    cart_id = flaskr.functions.get_or_create_cart_id()
+
+    #existence of the product and stock are checked by the store in the same statement as the change
+    error = flaskr.cart_store.add(cart_id, flaskr.products.to_product_id(data['productId']), data['amount'])
+    if error:
+        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart'][error]}, 404 if error == 'product_not_found' else 400
+    flaskr.functions.touch_cart_version()
 
     return flaskr.static_cache.SUCCESS_MESSAGES['cart']['product_added'], 202
 
@@ -67,20 +48,11 @@ def add_to_cart():
 @bp.route(config['ACTIONS']['remove']+'/<productId>', methods=['GET'])
 @bp.route(config['ACTIONS']['remove'], methods=['GET'], defaults={'productId': None})
 def remove_from_cart(productId):
-    cart_id = None
-    if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        cart_id = flask.g.cursor.fetchone()['id']
-    else:
-        flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (flask.request.cookies.get(config['COOKIE_NAMES']['cart']),))
-        cart_id = flask.g.cursor.fetchone()['id']
-
-    flask.g.cursor.execute('UPDATE carts SET lastModTime = %s WHERE id = %s', (int(time.time()), cart_id))
-    if productId:
-        flask.g.cursor.execute('DELETE FROM cartProducts WHERE productId = %s and cartId = %s', (productId, cart_id))
-    else:
-        flask.g.cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (cart_id,))
-    flask.g.conn.commit()
+    cart_id = flaskr.functions.get_cart_id()
+
+    if cart_id != None:
+        flaskr.cart_store.remove(cart_id, productId)
+    flaskr.functions.touch_cart_version()
 
     return flask.redirect(flask.request.referrer or '/')
 
@@ -88,25 +60,66 @@ def remove_from_cart(productId):
 @bp.route(config['ACTIONS']['edit']+'/<productId>', methods=['PUT'])
 def edit_cart_product(productId):
     data = json.loads(flask.request.get_data().decode())
-    flask.g.cursor.execute('SELECT * FROM products WHERE id = %s', (data['productId'],))
-    product = flask.g.cursor.fetchone()
-    if product == None:
-        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['product_not_found']}, 404
-    elif data['amount'] < 1:
+    if data['amount'] < 1:
         return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['amount_too_low']}, 400
-    elif (data['amount']) > product['stock']:
-        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['not_enough_in_stock']}, 400
     
-    cart_id = None
-    if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        cart_id = flask.g.cursor.fetchone()['id']
-    else:
-        flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (flask.request.cookies.get(config['COOKIE_NAMES']['cart']),))
-        cart_id = flask.g.cursor.fetchone()['id']
-
-    flask.g.cursor.execute('UPDATE carts SET lastModTime = %s WHERE id = %s', (int(time.time()), cart_id))
-    flask.g.cursor.execute('UPDATE cartProducts SET amount = %s WHERE productId = %s and cartId = %s', (data['amount'], productId, cart_id))
-    flask.g.conn.commit()
+    #products that are not in the cart are left as they are, so there is nothing to change without a cart
+    cart_id = flaskr.functions.get_cart_id()
+
+    error = None
+    if cart_id != None:
+        error = flaskr.cart_store.set_amount(cart_id, flaskr.products.to_product_id(productId), data['amount'])
+    if error:
+        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart'][error]}, 404 if error == 'product_not_found' else 400
+    flaskr.functions.touch_cart_version()
 
     return flaskr.static_cache.SUCCESS_MESSAGES['cart']['product_edited'], 202
+
+
+@bp.route(config['ACTIONS']['bulk'], methods=['POST'])
+def bulk_cart():
+    #{"mode": "add" or "set", "lines": [{"productId": 1, "amount": 2}, {"ean": "590...", "amount": 5}, ...]}
+    #one query for all products, all changes in one transaction, result for every line in the same order
+    data = json.loads(flask.request.get_data().decode())
+    mode = data.get('mode', 'add')
+    lines = data.get('lines') or []
+    if (mode not in ['add', 'set']) or (not isinstance(lines, list)) or (not all(isinstance(line, dict) for line in lines)):
+        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['invalid_bulk_data']}, 400
+    if len(lines) > int(config['GLOBAL']['cart_bulk_max_lines']):
+        return {"errors": flaskr.static_cache.ERROR_MESSAGES['cart']['too_many_lines']}, 400
+
+    products = flaskr.products.find_many([line.get('productId') for line in lines if line.get('productId') != None], [str(line['ean']) for line in lines if line.get('ean') != None])
+    products_by_id = {product['id']: product for product in products}
+    products_by_ean = {product['ean']: product for product in products}
+
+    #lines of the same product are merged (amounts summed for "add", last one wins for "set")
+    results = []
+    amounts = {}
+    for line in lines:
+        if line.get('productId') != None:
+            product = products_by_id.get(flaskr.products.to_product_id(line['productId']))
+        else:
+            product = products_by_ean.get(str(line.get('ean')))
+        amount = line.get('amount')
+        if product == None:
+            results.append({'productId': None, 'error': 'product_not_found'})
+        elif (not isinstance(amount, int)) or (amount < 1):
+            results.append({'productId': product['id'], 'error': 'amount_too_low'})
+        else:
+            amounts[product['id']] = amounts.get(product['id'], 0) + amount if mode == 'add' else amount
+            results.append({'productId': product['id'], 'error': None})
+
+    if amounts:
+        cart_id = flaskr.functions.get_or_create_cart_id()
+        line_errors = flaskr.cart_store.apply_lines(cart_id, [(product_id, amount, products_by_id[product_id]['stock']) for product_id, amount in amounts.items()], mode)
+        for result in results:
+            if result['error'] == None:
+                result['error'] = line_errors[result['productId']]
+        flaskr.functions.touch_cart_version()
+
+    for result in results:
+        result['added'] = result['error'] == None
+        result['errors'] = flaskr.static_cache.ERROR_MESSAGES['cart'][result['error']] if result['error'] else None
+        del result['error']
+
+    return flask.jsonify({'lines': results}), 202 if amounts else 400
@@ -0,0 +1,303 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import time
+import uuid
+import flask
+import dotenv
+import configparser
+import flaskr.redis_pool
+import flaskr.products
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+#redis backend: live cart is a hash per cart (productId -> amount, "_loaded" marks carts loaded from mysql, also empty ones),
+#changed carts are added to the dirty set and written to carts/cartProducts by scripts/cart_persister.py
+#every script returns -2 when the cart is not loaded yet, it is loaded from mysql and the script is run again
+#dirty carts never expire (changes remove the ttl), the ttl is set again once the cart is written to mysql
+LOADED_FIELD = '_loaded'
+
+LOAD_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], '_loaded', '1', unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+'''
+
+#ARGV: product id, amount, stock, cart id; returns new amount or -1 when there is not enough in stock
+ADD_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -2 end
+local amount = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') + tonumber(ARGV[2])
+if amount > tonumber(ARGV[3]) then return -1 end
+redis.call('HSET', KEYS[1], ARGV[1], amount)
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[4])
+return amount
+'''
+
+#ARGV: product id, amount, stock, cart id; products that are not in the cart are left as they are (returns 0)
+SET_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -2 end
+if tonumber(ARGV[2]) > tonumber(ARGV[3]) then return -1 end
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[4])
+return tonumber(ARGV[2])
+'''
+
+#ARGV: product id ("" removes all products), cart id
+REMOVE_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -2 end
+if ARGV[1] == '' then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], '_loaded', '1')
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+'''
+
+#ARGV: mode ("add" or "set"), cart id, then (product id, amount, stock) for every line; returns new amounts, -1 for lines over stock
+BULK_SCRIPT = '''
+if redis.call('EXISTS', KEYS[1]) == 0 then return -2 end
+local results = {}
+for i = 3, #ARGV, 3 do
+    local amount = tonumber(ARGV[i + 1])
+    if ARGV[1] == 'add' then
+        amount = amount + tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+    end
+    if amount > tonumber(ARGV[i + 2]) then
+        table.insert(results, -1)
+    else
+        redis.call('HSET', KEYS[1], ARGV[i], amount)
+        table.insert(results, amount)
+    end
+end
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return results
+'''
+
+#ARGV: ttl, cart id; ttl is set only if the cart was not changed again since it was persisted
+EXPIRE_CLEAN_SCRIPT = '''
+if redis.call('SISMEMBER', KEYS[2], ARGV[2]) == 1 then return 0 end
+return redis.call('EXPIRE', KEYS[1], ARGV[1])
+'''
+
+#ARGV: lock token; the lock is deleted only by its owner (it may have expired and been taken by another persister)
+RELEASE_LOCK_SCRIPT = '''
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+'''
+
+_scripts = {}
+
+
+def is_redis_backend():
+    return config['CART_STORE']['backend'] == 'redis'
+
+
+def get_script(name, source):
+    if name not in _scripts:
+        _scripts[name] = flaskr.redis_pool.get_client().register_script(source)
+    return _scripts[name]
+
+
+def get_key(cart_id):
+    return f"{config['REDIS_QUEUES']['cart_store']}:{cart_id}"
+
+
+def get_dirty_key():
+    return f"{config['REDIS_QUEUES']['cart_store']}:dirty"
+
+
+def get_lock_key(cart_id):
+    return f"{config['REDIS_QUEUES']['cart_store']}:lock:{cart_id}"
+
+
+def get_ttl():
+    return int(config['CART_STORE']['ttl'])
+
+
+def load(cart_id):
+    flask.g.cursor.execute('SELECT productId, amount FROM cartProducts WHERE cartId = %s', (cart_id,))
+    fields = []
+    for row in flask.g.cursor.fetchall():
+        fields += [row['productId'], row['amount']]
+    get_script('load', LOAD_SCRIPT)(keys=[get_key(cart_id)], args=[get_ttl()] + fields)
+
+
+def run_script(name, source, cart_id, args):
+    script = get_script(name, source)
+    keys = [get_key(cart_id), get_dirty_key()]
+    result = script(keys=keys, args=args)
+    if result == -2:
+        load(cart_id)
+        result = script(keys=keys, args=args)
+    return result
+
+
+def get_items(cart_id):
+    #list of {'productId', 'amount'} dicts
+    if not is_redis_backend():
+        flask.g.cursor.execute('SELECT productId, amount FROM cartProducts WHERE cartId = %s', (cart_id,))
+        return flask.g.cursor.fetchall()
+
+    redis_client = flaskr.redis_pool.get_client()
+    items = redis_client.hgetall(get_key(cart_id))
+    if not items:
+        load(cart_id)
+        items = redis_client.hgetall(get_key(cart_id))
+    return [{'productId': int(product_id), 'amount': int(amount)} for product_id, amount in items.items() if product_id.decode() != LOADED_FIELD]
+
+
+def add(cart_id, product_id, amount):
+    #returns None or error key (ERROR_MESSAGES['cart']) when the product does not exist or the cart would contain more than stock
+    if is_redis_backend():
+        product = flaskr.products.get(product_id, fresh=True)
+        if product == None:
+            return 'product_not_found'
+        if run_script('add', ADD_SCRIPT, cart_id, [product['id'], amount, product['stock'], cart_id]) == -1:
+            return 'not_enough_in_stock'
+        return None
+
+    #one statement: inserted (1 row) or increased (2 rows) only if the product exists and the new amount fits in stock,
+    #carts.lastModTime is updated by cartProducts triggers (migration 0005)
+    flask.g.cursor.execute('''
+        INSERT INTO cartProducts (cartId, productId, amount)
+        SELECT %s, products.id, %s FROM products WHERE products.id = %s AND products.stock >= %s
+        ON DUPLICATE KEY UPDATE cartProducts.amount = IF(cartProducts.amount + %s <= products.stock, cartProducts.amount + %s, cartProducts.amount)
+    ''', (cart_id, amount, product_id, amount, amount, amount))
+    changed = flask.g.cursor.rowcount
+    flask.g.conn.commit()
+    if changed:
+        return None
+    return 'product_not_found' if flaskr.products.get(product_id) == None else 'not_enough_in_stock'
+
+
+def set_amount(cart_id, product_id, amount):
+    #returns None or error key, products that are not in the cart are left as they are
+    if is_redis_backend():
+        product = flaskr.products.get(product_id, fresh=True)
+        if product == None:
+            return 'product_not_found'
+        if run_script('set', SET_SCRIPT, cart_id, [product['id'], amount, product['stock'], cart_id]) == -1:
+            return 'not_enough_in_stock'
+        return None
+
+    flask.g.cursor.execute('''
+        UPDATE cartProducts JOIN products ON products.id = cartProducts.productId
+        SET cartProducts.amount = %s
+        WHERE cartProducts.cartId = %s AND cartProducts.productId = %s AND products.stock >= %s
+    ''', (amount, cart_id, product_id, amount))
+    changed = flask.g.cursor.rowcount
+    flask.g.conn.commit()
+    if changed:
+        return None
+    #nothing changed: unknown product, not enough in stock, or the same amount / product not in the cart (not an error)
+    product = flaskr.products.get(product_id, fresh=True)
+    if product == None:
+        return 'product_not_found'
+    return 'not_enough_in_stock' if amount > product['stock'] else None
+
+
+def apply_lines(cart_id, lines, mode):
+    #lines are (product id, amount, stock) of existing products, mode "add" increases amounts in the cart, "set" replaces them
+    #all lines are applied at once (one transaction with the cart rows locked, or one lua script),
+    #returns {product id: None or error key} with lines that would exceed stock left out
+    if is_redis_backend():
+        args = [mode, cart_id]
+        for product_id, amount, stock in lines:
+            args += [product_id, amount, stock]
+        amounts = run_script('bulk', BULK_SCRIPT, cart_id, args)
+        return {product_id: ('not_enough_in_stock' if new_amount == -1 else None) for (product_id, amount, stock), new_amount in zip(lines, amounts)}
+
+    flask.g.cursor.execute('SELECT productId, amount FROM cartProducts WHERE cartId = %s FOR UPDATE', (cart_id,))
+    current_amounts = {row['productId']: row['amount'] for row in flask.g.cursor.fetchall()}
+
+    results = {}
+    rows = []
+    for product_id, amount, stock in lines:
+        new_amount = current_amounts.get(product_id, 0) + amount if mode == 'add' else amount
+        if new_amount > stock:
+            results[product_id] = 'not_enough_in_stock'
+            continue
+        results[product_id] = None
+        rows.append((cart_id, product_id, new_amount))
+
+    if rows:
+        flask.g.cursor.executemany('INSERT INTO cartProducts (cartId, productId, amount) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE amount = VALUES(amount)', rows)
+    flask.g.conn.commit()
+    return results
+
+
+def remove(cart_id, product_id=None):
+    #product_id None removes all products
+    if is_redis_backend():
+        run_script('remove', REMOVE_SCRIPT, cart_id, [product_id or '', cart_id])
+        return
+
+    if product_id:
+        flask.g.cursor.execute('DELETE FROM cartProducts WHERE productId = %s and cartId = %s', (product_id, cart_id))
+    else:
+        flask.g.cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (cart_id,))
+    flask.g.conn.commit()
+
+
+def persist(mydb, cursor, redis_client, cart_id):
+    #writes the live cart to mysql, returns False when another process holds the cart lock
+    lock_token = str(uuid.uuid4())
+    if not redis_client.set(get_lock_key(cart_id), lock_token, nx=True, ex=int(config['CART_STORE']['lock_timeout'])):
+        return False
+    try:
+        redis_client.srem(get_dirty_key(), cart_id)
+        items = redis_client.hgetall(get_key(cart_id))
+        if not items:
+            #dirty carts have no ttl, so the hash is gone only if it was dropped after a flush or evicted by redis
+            logger.warning(f'Cart {cart_id} was dirty but is missing in redis, changes since the last persist are lost')
+            return True
+        rows = [(cart_id, int(product_id), int(amount)) for product_id, amount in items.items() if product_id.decode() != LOADED_FIELD]
+        cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (cart_id,))
+        if rows:
+            cursor.executemany('INSERT INTO cartProducts (cartId, productId, amount) VALUES (%s, %s, %s)', rows)
+        cursor.execute('UPDATE carts SET lastModTime = %s WHERE id = %s', (int(time.time()), cart_id))
+        mydb.commit()
+        redis_client.register_script(EXPIRE_CLEAN_SCRIPT)(keys=[get_key(cart_id), get_dirty_key()], args=[get_ttl(), cart_id])
+        return True
+    except Exception:
+        mydb.rollback()
+        redis_client.sadd(get_dirty_key(), cart_id)
+        raise
+    finally:
+        redis_client.register_script(RELEASE_LOCK_SCRIPT)(keys=[get_lock_key(cart_id)], args=[lock_token])
+
+
+def flush(cart_id):
+    #synchronous write-behind before mysql is read or changed directly (login/logout cart migration, checkout)
+    if not is_redis_backend():
+        return
+    redis_client = flaskr.redis_pool.get_client()
+    deadline = time.monotonic() + int(config['CART_STORE']['lock_timeout'])
+    while not persist(flask.g.conn, flask.g.cursor, redis_client, cart_id):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'Cart {cart_id} is locked by the persister')
+        time.sleep(0.01)
+
+
+def drop(cart_id):
+    #forget the live copy after cartProducts were changed in mysql, next access loads it again
+    if is_redis_backend():
+        flaskr.redis_pool.get_client().delete(get_key(cart_id))
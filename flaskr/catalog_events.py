@@ -0,0 +1,64 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import dotenv
+import configparser
+import flaskr.facets
+import flaskr.products
+import flaskr.suggest
+import flaskr.catalog_filter
+import flaskr.page_cache
+import flaskr.static_cache
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+FACET_FIELDS = ['categoryId', 'stock', 'priceNet', 'vatRate', 'priceGross']
+
+
+def products_changed(changes, redis_client):
+    #call after writing products, changes is a list of (old row, new row) tuples, None for inserted/deleted products
+    #outside of the flask app (scripts) static data has to be loaded first (flaskr.functions.load_static_data)
+    product_ids = set()
+    facet_category_ids = set()
+    page_cache_tags = set()
+    for old_row, new_row in changes:
+        #any change of a product is visible on its page and on listings of its category and all ancestors
+        for row in (old_row, new_row):
+            if row:
+                product_ids.add(row['id'])
+                page_cache_tags.add(f"product:{row['id']}")
+                page_cache_tags.update(get_category_tags(row['categoryId']))
+        if any((old_row or {}).get(field) != (new_row or {}).get(field) for field in FACET_FIELDS):
+            for row in (old_row, new_row):
+                if row:
+                    facet_category_ids.add(row['categoryId'])
+
+    if product_ids:
+        flaskr.products.invalidate(product_ids, redis_client)
+        flaskr.suggest.products_changed(changes)
+        flaskr.catalog_filter.products_changed(changes)
+
+    if facet_category_ids:
+        flaskr.facets.invalidate(facet_category_ids, redis_client)
+        logger.info(f'Facet counts invalidated for categories {sorted(facet_category_ids)}')
+
+    if page_cache_tags:
+        flaskr.page_cache.invalidate_tags(page_cache_tags, redis_client)
+        logger.info(f'Page cache invalidated for {len(page_cache_tags)} tags')
+
+
+def get_category_tags(category_id):
+    tags = {'category:all'}
+    for category in flaskr.static_cache.CATEGORY_INDEX['ancestors'].get(category_id, []):
+        tags.add(f"category:{category['id']}")
+    return tags
@@ -0,0 +1,119 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import time
+import array
+import bisect
+import threading
+import flask
+import dotenv
+import configparser
+import flaskr.cache_sync
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+STATS = {'product_lookups': 0, 'product_rejected': 0, 'category_rejected': 0}
+_stats_lock = threading.Lock()
+
+#sorted array of all product ids (8 bytes per product), None until first use in the worker
+_ids = None
+_built_at = 0
+_lock = threading.Lock()
+
+
+def count(name):
+    with _stats_lock:
+        STATS[name] += 1
+
+
+def is_enabled():
+    return int(config['CATALOG_FILTER']['enabled']) == 1
+
+
+def build():
+    flask.g.cursor.execute('SELECT id FROM products ORDER BY id')
+    return array.array('q', (row['id'] for row in flask.g.cursor.fetchall()))
+
+
+def get_ids():
+    #rebuilt every max_age seconds as well, so products added outside of catalog_events are found eventually
+    #the array is never changed after it is published (events swap in a new one), so readers do not lock
+    global _ids, _built_at
+    ids = _ids
+    if (ids == None) or (time.monotonic() - _built_at > int(config['CATALOG_FILTER']['max_age'])):
+        with _lock:
+            ids = _ids
+            if (ids == None) or (time.monotonic() - _built_at > int(config['CATALOG_FILTER']['max_age'])):
+                ids = build()
+                _ids = ids
+                _built_at = time.monotonic()
+                logger.info(f'Catalog filter built with {len(ids)} products')
+    return ids
+
+
+def has_product(product_id):
+    #False only for ids that certainly do not exist, they are answered with 404 without querying products
+    if (not is_enabled()) or (product_id == None):
+        return product_id != None
+    count('product_lookups')
+    ids = get_ids()
+    position = bisect.bisect_left(ids, product_id)
+    if (position < len(ids)) and (ids[position] == product_id):
+        return True
+    count('product_rejected')
+    return False
+
+
+def category_rejected():
+    #unknown category paths are resolved by the in-memory category index, only counted here
+    count('category_rejected')
+
+
+def products_changed(changes):
+    #inserted and deleted products are published to every worker (see handle_filter_event)
+    added = [new_row['id'] for old_row, new_row in changes if (old_row == None) and new_row]
+    removed = [old_row['id'] for old_row, new_row in changes if old_row and (new_row == None)]
+    if added or removed:
+        flaskr.cache_sync.publish('catalog_filter', {'added': added, 'removed': removed})
+
+
+def handle_filter_event(payload):
+    #applied to a copy which replaces the published array
+    global _ids
+    with _lock:
+        if _ids == None:
+            return
+        ids = array.array('q', _ids)
+        for product_id in payload['removed']:
+            position = bisect.bisect_left(ids, product_id)
+            if (position < len(ids)) and (ids[position] == product_id):
+                del ids[position]
+        for product_id in payload['added']:
+            position = bisect.bisect_left(ids, product_id)
+            if (position == len(ids)) or (ids[position] != product_id):
+                ids.insert(position, product_id)
+        _ids = ids
+
+
+def resync_filter():
+    #events could have been missed while the listener was disconnected, rebuilt on next use
+    global _ids
+    _ids = None
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(STATS)
+    ids = _ids
+    stats['products'] = len(ids) if ids != None else None
+    return stats
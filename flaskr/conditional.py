@@ -0,0 +1,110 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import hashlib
+import datetime
+import time
+from functools import wraps
+import flask
+import dotenv
+import configparser
+import flaskr.static_cache
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return int(config['CONDITIONAL_GET']['enabled']) == 1
+
+
+def get_visitor_version():
+    #pages show the logged in user and the cart, so they are part of the etag (cart_version is bumped on every cart change)
+    return f"{flask.session.get('user_id')}:{flask.session.get('cart_version')}:{flask.request.cookies.get(config['COOKIE_NAMES']['cart'])}"
+
+
+def has_visitor_state():
+    return bool(flask.session.get('user_id') or flask.session.get('cart_version'))
+
+
+def get_csrf_bucket_start():
+    #pages embed csrf tokens which expire after WTF_CSRF_TIME_LIMIT seconds, so a page is never revalidated for longer than
+    #half of it: the etag changes and last modified moves forward at the start of every bucket (None when tokens do not expire)
+    time_limit = flask.current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not time_limit:
+        return None
+    bucket_length = max(int(time_limit) // 2, 1)
+    return int(time.time()) // bucket_length * bucket_length
+
+
+def get_etag(content_version, bucket_start=None):
+    raw_etag = f'{content_version}|{flaskr.static_cache.VERSION}|{get_visitor_version()}|{bucket_start}'
+    return hashlib.sha256(raw_etag.encode()).hexdigest()[:32]
+
+
+def is_not_modified(etag, last_modified):
+    if flask.request.if_none_match:
+        return flask.request.if_none_match.contains_weak(etag)
+    #last modified says nothing about the visitor, so it is only trusted for visitors without session state (crawlers)
+    if flask.request.if_modified_since and not has_visitor_state():
+        return last_modified.replace(microsecond=0) <= flask.request.if_modified_since
+    return False
+
+
+def conditional(validator):
+    #validator(*view_args) returns (content version, last modified datetime) or None when the page can not be validated
+    #304 is returned before the view runs, so nothing is rendered or compressed
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if (not is_enabled()) or (flask.request.method not in ['GET', 'HEAD']):
+                return f(*args, **kwargs)
+
+            validators = validator(*args, **kwargs)
+            if validators == None:
+                return f(*args, **kwargs)
+            content_version, last_modified = validators
+            bucket_start = get_csrf_bucket_start()
+            if bucket_start != None:
+                last_modified = max(last_modified, datetime.datetime.fromtimestamp(bucket_start, datetime.timezone.utc))
+            etag = get_etag(content_version, bucket_start)
+
+            if is_not_modified(etag, last_modified):
+                response = flask.Response(status=304)
+            else:
+                response = flask.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
+
+
+def get_templates_mtime(*templates):
+    #every page extends common.html, so it is always included
+    template_dir = os.path.join(flask.current_app.root_path, flask.current_app.template_folder)
+    return max(os.path.getmtime(os.path.join(template_dir, template)) for template in ('common.html',) + templates)
+
+
+def template_validator(*templates):
+    #static content pages change only with templates, configuration or static data (categories in menu)
+    def validator(*args, **kwargs):
+        try:
+            mtime = max(get_templates_mtime(*templates), os.path.getmtime(f'{working_dir}/config.ini'))
+        except OSError:
+            return None
+        return mtime, datetime.datetime.fromtimestamp(int(mtime), datetime.timezone.utc)
+    return validator
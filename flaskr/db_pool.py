@@ -0,0 +1,235 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import threading
+import time
+import mysql.connector
+from mysql.connector.constants import ClientFlag
+import dotenv
+import configparser
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class PooledConnection:
+    #thin wrapper around mysql connection, close() hands the connection back to the pool instead of closing the socket
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw_conn = raw_conn
+        self._created_at = created_at
+        self._last_used = time.monotonic()
+        self._uses = 0
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw_conn, name)
+
+    def close(self):
+        if self._checked_out:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    def __init__(self, min_size, max_size, max_uses, max_lifetime, wait_timeout, health_check_idle_time):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.health_check_idle_time = health_check_idle_time
+        self.pid = os.getpid()
+
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        #without FOUND_ROWS rowcount is the number of changed rows, so "INSERT ... ON DUPLICATE KEY UPDATE" tells inserted (1), updated (2) and unchanged (0) apart
+        #sessions are in UTC, so TIMESTAMP columns (products.updatedAt) are read as naive UTC datetimes
+        raw_conn = mysql.connector.connect(host=os.getenv('DB_HOST'), user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), database=os.getenv('DB_NAME'), auth_plugin=os.getenv('DB_AUTH_PLUGIN'), client_flags=[-ClientFlag.FOUND_ROWS], time_zone='+00:00')
+        return PooledConnection(self, raw_conn, time.monotonic())
+
+    def _discard(self, conn):
+        try:
+            conn._raw_conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, conn):
+        if self.max_uses and conn._uses >= self.max_uses:
+            return True
+        if self.max_lifetime and (time.monotonic() - conn._created_at) >= self.max_lifetime:
+            return True
+        return False
+
+    def _is_healthy(self, conn):
+        #ping only connections that were idle long enough to be dropped by the server
+        if (time.monotonic() - conn._last_used) < self.health_check_idle_time:
+            return True
+        try:
+            conn._raw_conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def fill(self):
+        #open connections up to min_size, used on startup so the first requests do not pay the handshake
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def get_connection(self):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            conn = None
+            with self._cond:
+                waited = False
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(f'No database connection available within {self.wait_timeout}s (max_size={self.max_size})')
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif self._is_expired(conn) or not self._is_healthy(conn):
+                with self._cond:
+                    if self._is_expired(conn):
+                        self._stats['recycled'] += 1
+                    else:
+                        self._stats['failed_health_checks'] += 1
+                    self._size -= 1
+                    self._cond.notify()
+                self._discard(conn)
+                continue
+
+            conn._uses += 1
+            conn._checked_out = True
+            with self._cond:
+                self._stats['checkouts'] += 1
+                in_use = self._size - len(self._idle)
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], in_use)
+            return conn
+
+    def release(self, conn):
+        conn._checked_out = False
+        conn._last_used = time.monotonic()
+
+        #never hand out a connection with an open transaction
+        try:
+            if conn._raw_conn.in_transaction:
+                conn._raw_conn.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        if (not healthy) or self._is_expired(conn) or (os.getpid() != self.pid):
+            with self._cond:
+                if healthy:
+                    self._stats['recycled'] += 1
+                self._size -= 1
+                self._cond.notify()
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pid': self.pid,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    #pool is per process, connections inherited through fork (gunicorn --preload) are never reused
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(
+                    min_size=int(config['DB_POOL']['min_size']),
+                    max_size=int(config['DB_POOL']['max_size']),
+                    max_uses=int(config['DB_POOL']['max_uses']),
+                    max_lifetime=int(config['DB_POOL']['max_lifetime']),
+                    wait_timeout=float(config['DB_POOL']['wait_timeout']),
+                    health_check_idle_time=float(config['DB_POOL']['health_check_idle_time'])
+                )
+                logger.info(f'Database connection pool created for pid {_pool.pid}')
+                threading.Thread(target=_fill_pool, args=(_pool,), daemon=True).start()
+    return _pool
+
+
+def _fill_pool(pool):
+    try:
+        pool.fill()
+    except Exception as e:
+        logger.warning(f'Could not pre-open database connections: {e}')
+
+
+def get_pool_stats():
+    if _pool is None or _pool.pid != os.getpid():
+        return {}
+    return _pool.stats()
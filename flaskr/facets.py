@@ -0,0 +1,108 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import json
+import decimal
+import flask
+import dotenv
+import configparser
+import flaskr.static_cache
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+AVAILABILITY_CONDITIONS = {
+    'all': 'stock >= 0',
+    'available': 'stock > 0',
+    'not-available': 'stock = 0',
+}
+ANY_PRICE = 'any'
+
+
+def is_enabled():
+    return int(config['FACET_CACHE']['enabled']) == 1
+
+
+def get_key(category_id):
+    #one redis hash per category (with its subcategories), fields are price bands
+    #static data version is part of the key, so changes of the category tree drop all counts at once
+    return f"{config['REDIS_QUEUES']['facet_counts']}:{flaskr.static_cache.VERSION}:{category_id if category_id != None else 'all'}"
+
+
+def get_price_band(user_config):
+    if user_config['price_filter'] != 'on':
+        return ANY_PRICE, None
+    try:
+        price_from, price_to = [float(value) for value in user_config['price_filter_values'].split('to')]
+    except (AttributeError, ValueError):
+        return ANY_PRICE, None
+    return f'{price_from:g}to{price_to:g}', (price_from, price_to)
+
+
+def compute_counts(base_where, base_params, price_range):
+    #counts and max gross price per availability for the whole category and for the price band in one query
+    price_sql = 'priceGross >= %s AND priceGross <= %s' if price_range else '1 = 1'
+    selects = []
+    params = []
+    for name, condition in AVAILABILITY_CONDITIONS.items():
+        selects.append(f'SUM({condition}) AS `any_{name}_count`')
+        selects.append(f'MAX(CASE WHEN {condition} THEN priceGross END) AS `any_{name}_max`')
+        selects.append(f'SUM({condition} AND {price_sql}) AS `band_{name}_count`')
+        selects.append(f'MAX(CASE WHEN {condition} AND {price_sql} THEN priceGross END) AS `band_{name}_max`')
+        params += list(price_range or ()) * 2
+
+    flask.g.cursor.execute(f"SELECT {', '.join(selects)} FROM products WHERE {base_where}", tuple(params) + tuple(base_params))
+    row = flask.g.cursor.fetchone()
+
+    counts = {}
+    for band in ['any', 'band']:
+        counts[band] = {name: [int(row[f'{band}_{name}_count'] or 0), str(row[f'{band}_{name}_max'] or 0)] for name in AVAILABILITY_CONDITIONS}
+    return counts['any'], counts['band']
+
+
+def get_counts(category_id, base_where, base_params, user_config):
+    band, price_range = get_price_band(user_config)
+    key = get_key(category_id)
+
+    cached = [None, None]
+    try:
+        cached = [json.loads(value) if value else None for value in flask.g.redis_client.hmget(key, [ANY_PRICE, band])]
+    except Exception as e:
+        logger.warning(f'Facet cache read failed: {e}')
+
+    any_counts, band_counts = cached
+    if (any_counts == None) or (band_counts == None):
+        any_counts, band_counts = compute_counts(base_where, base_params, price_range)
+        try:
+            pipe = flask.g.redis_client.pipeline(transaction=False)
+            pipe.hset(key, mapping={ANY_PRICE: json.dumps(any_counts), band: json.dumps(band_counts)})
+            pipe.expire(key, int(config['FACET_CACHE']['ttl']))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f'Facet cache write failed: {e}')
+
+    return {
+        'total_products': any_counts['all'][0],
+        'total_products_with_filters': band_counts[user_config['availability']][0],
+        'max_price_gross': decimal.Decimal(band_counts[user_config['availability']][1]),
+        'availability_counts': {name: value[0] for name, value in band_counts.items()},
+    }
+
+
+def invalidate(category_ids, redis_client=None):
+    #counts of a category include all its subcategories, so every ancestor and the whole shop entry are dropped as well
+    category_index = flaskr.static_cache.CATEGORY_INDEX
+    keys = {get_key(None)}
+    for category_id in category_ids:
+        for category in category_index['ancestors'].get(category_id, []):
+            keys.add(get_key(category['id']))
+    (redis_client or flask.g.redis_client).delete(*keys)
@@ -6,6 +6,7 @@ import os
 import flask
 import dotenv
 import configparser
+import flaskr.conditional
 import logging
 
 
@@ -21,61 +22,73 @@ bp = flask.Blueprint('footer', __name__, url_prefix='/')
 
 
 @bp.route(config['ENDPOINTS']['about'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/about_us.html'))
 def about_us():
     return flask.render_template('footer/about_us.html')
 
 
 @bp.route(config['ENDPOINTS']['contact'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/contact.html'))
 def contact():
     return flask.render_template('footer/contact.html')
 
 
 @bp.route(config['ENDPOINTS']['payments'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/payments.html'))
 def payments():
     return flask.render_template('footer/payments.html')
 
 
 @bp.route(config['ENDPOINTS']['shipping'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/shipping.html'))
 def shipping():
     return flask.render_template('footer/shipping.html')
 
 
 @bp.route(config['ENDPOINTS']['dropshipping'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/dropshipping.html'))
 def dropshipping():
     return flask.render_template('footer/dropshipping.html')
 
 
 @bp.route(config['ENDPOINTS']['faq'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/faq.html'))
 def faq():
     return flask.render_template('footer/faq.html')
 
 
 @bp.route(config['ENDPOINTS']['regulations'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/regulations.html'))
 def regulations():
     return flask.render_template('footer/regulations.html')
 
 
 @bp.route(config['ENDPOINTS']['privacy_policy'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/privacy_policy.html'))
 def privacy_policy():
     return flask.render_template('footer/privacy_policy.html')
 
 
 @bp.route(config['ENDPOINTS']['returns'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/returns.html'))
 def returns():
     return flask.render_template('footer/returns.html')
 
 
 @bp.route(config['ENDPOINTS']['complaints'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/complaints.html'))
 def complaints():
     return flask.render_template('footer/complaints.html')
 
 
 @bp.route(config['ENDPOINTS']['purchase_safety'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/purchase_safety.html'))
 def purchase_safety():
     return flask.render_template('footer/purchase_safety.html')
 
 
 @bp.route(config['ENDPOINTS']['cooperation'], methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('footer/cooperation.html'))
 def cooperation():
     return flask.render_template('footer/cooperation.html')
 
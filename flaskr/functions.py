@@ -9,8 +9,6 @@ import ast
 import ssl
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import mysql.connector
-import redis
 import dotenv
 import configparser
 import base64
@@ -19,8 +17,15 @@ import datetime
 import uuid
 import time
 import traceback
-import hashlib
+import itsdangerous
+import json
 import flaskr.jinja_filters
+import flaskr.db_pool
+import flaskr.redis_pool
+import flaskr.products
+import flaskr.cart_store
+import flaskr.static_cache
+import flaskr.cache_sync
 import logging
 
 dotenv.load_dotenv()
@@ -32,12 +37,14 @@ logger = logging.getLogger(__name__)
 
 
 def connect_db():
-    conn = mysql.connector.connect(host=os.getenv('DB_HOST'), user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), database=os.getenv('DB_NAME'), auth_plugin=os.getenv('DB_AUTH_PLUGIN'))
+    #connection is checked out from the per-process pool, conn.close() returns it to the pool
+    conn = flaskr.db_pool.get_pool().get_connection()
     return conn
 
 
 def connect_redis():
-    redis_client = redis.Redis(host=config['REDIS']['host'], port=config['REDIS']['port'], db=config['REDIS']['db'])
+    #shared client backed by the per-process connection pool, close() does not drop pooled connections
+    redis_client = flaskr.redis_pool.get_client()
     return redis_client
 
 
@@ -92,6 +99,72 @@ def build_category_tree(flat_categories):
     return root_categories
 
 
+def build_category_index(category_tree):
+    #precomputed lookups over the category tree, so shop routes resolve categories without sql
+    #paths: tuple of slugs from root -> node, ancestors: id -> list of nodes from root to the category itself, descendants: id -> set of ids of the category and all its subcategories
+    category_index = {'paths': {}, 'ancestors': {}, 'descendants': {}}
+
+    def walk(node, parents):
+        lineage = parents + [node]
+        category_index['paths'][tuple(cat['slug'] for cat in lineage)] = node
+        category_index['ancestors'][node['id']] = lineage
+        for cat in lineage:
+            category_index['descendants'].setdefault(cat['id'], set()).add(node['id'])
+        for child in node['children']:
+            walk(child, lineage)
+
+    for root_category in category_tree:
+        walk(root_category, [])
+
+    return category_index
+
+
+def load_static_data(version=None):
+    #everything is built aside and then swapped in, each name is replaced by a single assignment so readers never block or see a half built object
+    if version is None:
+        try:
+            version = flaskr.cache_sync.get_version(config['REDIS_QUEUES']['static_data_version'])
+        except Exception as e:
+            logger.warning(f'Could not read static data version: {e}')
+            version = 0
+
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM categories")
+        categories = build_category_tree(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+    category_index = build_category_index(categories)
+    with open(f'{working_dir}flaskr/json/errors.json', 'r') as f:
+        error_messages = json.load(f)
+    with open(f'{working_dir}flaskr/json/successes.json', 'r') as f:
+        success_messages = json.load(f)
+
+    flaskr.static_cache.CATEGORY_INDEX = category_index
+    flaskr.static_cache.CATEGORIES = categories
+    flaskr.static_cache.ERROR_MESSAGES = error_messages
+    flaskr.static_cache.SUCCESS_MESSAGES = success_messages
+    flaskr.static_cache.VERSION = version
+    logger.info(f'Static data loaded (version {version})')
+
+
+def reload_static_data_if_changed(payload=None):
+    #called by cache_sync listener on static_data events and after every reconnect
+    if payload:
+        version = payload['version']
+    else:
+        version = flaskr.cache_sync.get_version(config['REDIS_QUEUES']['static_data_version'])
+    if version != flaskr.static_cache.VERSION:
+        load_static_data(version)
+
+
+def notify_static_data_changed():
+    #call after changing categories or json messages, every worker of every node reloads its static data in the background
+    return flaskr.cache_sync.publish('static_data', version_key=config['REDIS_QUEUES']['static_data_version'])
+
+
 def get_config_cookie(request):
     default_cookie = [int(config['USER_PREF_COOKIE']['default_visibility_per_page']), config['USER_PREF_COOKIE']['default_sorting_option'], config['USER_PREF_COOKIE']['default_availability'], config['USER_PREF_COOKIE']['default_price_filter'], config['USER_PREF_COOKIE']['default_price_filter_values']]
 
@@ -134,73 +207,164 @@ def get_config_cookie(request):
     return return_dict
 
 
-def init_cart(response):
-    #check if redis_client is available
-    redis_client = getattr(flask.g, "redis_client", None)
-    if redis_client is None:
-        return response
+def is_exempt_request():
+    #static files, unmatched urls (404) and endpoints listed in config never touch db, redis or the cart
+    endpoint = flask.request.endpoint
+    return (endpoint is None) or (endpoint in get_config_list('str', config['ADVANCED']['middleware_exempt_endpoints']))
 
-    #prevent duplicates of uuid carts for concurrent requests withing the same session
-    raw_id = f"{flask.request.remote_addr}:{flask.request.headers.get('User-Agent')}"
-    hashed_id = hashlib.sha256(raw_id.encode()).hexdigest()
-    lock_key = f"{ config['REDIS_QUEUES']['init_cart_lock_queue'] }:{ hashed_id }"
-    if (not flask.g.redis_client.set(lock_key, '1', nx=True, ex=int(config['ADVANCED']['cart_init_lock_time']))) or ('static' in flask.request.url):
-        return response
-    
+
+#format of session['cart_id'] ([version, user id, cart id]), values of other versions are ignored and looked up again
+CART_SESSION_VERSION = 2
+
+
+def get_cart_signer():
+    return itsdangerous.Signer(flask.current_app.config['SECRET_KEY'], salt='cart-cookie')
+
+
+def accepts_legacy_cart_cookies():
+    cutoff = config['ADVANCED']['legacy_cart_cookie_cutoff'].strip()
+    return bool(cutoff) and (datetime.date.today() <= datetime.date.fromisoformat(cutoff))
+
+
+def get_cart_cookie():
+    #(uuid, cart id) from the signed cart cookie, checked in process (no query for forged or broken cookies),
+    #cart id is None for legacy cookies (unsigned uuid, accepted until ADVANCED legacy_cart_cookie_cutoff, or signed uuid only)
     cart_cookie = flask.request.cookies.get(config['COOKIE_NAMES']['cart'])
+    if not cart_cookie:
+        return None, None
+    try:
+        value = get_cart_signer().unsign(cart_cookie).decode()
+        if ':' not in value:
+            return value, None
+        cart_uuid, cart_id = value.split(':')
+        return cart_uuid, int(cart_id)
+    except (itsdangerous.BadSignature, ValueError):
+        pass
+    if not accepts_legacy_cart_cookies():
+        return None, None
+    try:
+        return str(uuid.UUID(cart_cookie)), None
+    except ValueError:
+        return None, None
+
+
+def set_cart_cookie(response):
+    #called in after_rq, the cookie is set only when a cart was created or a legacy cookie was accepted in this request
+    new_cart_cookie = flask.g.get('new_cart_cookie')
+    if new_cart_cookie:
+        cart_uuid, cart_id = new_cart_cookie
+        response.set_cookie(config['COOKIE_NAMES']['cart'], get_cart_signer().sign(f'{cart_uuid}:{cart_id}').decode(), expires=datetime.datetime.now() + datetime.timedelta(days=365*10), path='/')
+    return response
+
+
+def get_user_cart_id(user_id):
+    #memoised per request in flask.g and kept in the signed session, None until the first cart change of the user
+    cart_ids = flask.g.setdefault('cart_ids', {})
+    if ('user', user_id) not in cart_ids:
+        session_cart = flask.session.get('cart_id')
+        if session_cart and (session_cart[:2] == [CART_SESSION_VERSION, user_id]):
+            cart_ids[('user', user_id)] = session_cart[2]
+        else:
+            flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (user_id,))
+            row = flask.g.cursor.fetchone()
+            cart_ids[('user', user_id)] = row['id'] if row else None
+            if row:
+                flask.session['cart_id'] = [CART_SESSION_VERSION, user_id, row['id']]
+                mark_cart_valid(row['id'])
+    return cart_ids[('user', user_id)]
+
+
+def create_user_cart(user_id):
+    #one cart per user is guaranteed by uq_carts_user_id (migration 0006), concurrent requests get the same cart
+    flask.g.cursor.execute('INSERT INTO carts (userId, lastModTime) VALUES (%s, %s) ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)', (user_id, int(time.time())))
+    flask.g.conn.commit()
+    cart_id = flask.g.cursor.lastrowid
+    flask.g.setdefault('cart_ids', {})[('user', user_id)] = cart_id
+    flask.session['cart_id'] = [CART_SESSION_VERSION, user_id, cart_id]
+    mark_cart_valid(cart_id)
+    return cart_id
+
+
+def get_cookie_cart_id():
+    #memoised per request in flask.g, None when there is no valid cookie,
+    #the id comes from the signed cookie without a query (the cart may have expired since, see get_or_create_cart_id)
+    cart_ids = flask.g.setdefault('cart_ids', {})
+    if 'cookie' not in cart_ids:
+        cart_uuid, cart_id = get_cart_cookie()
+        if (cart_uuid != None) and (cart_id == None):
+            #legacy cookie, signed again with the cart id if the cart exists
+            flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (cart_uuid,))
+            row = flask.g.cursor.fetchone()
+            if row:
+                cart_id = row['id']
+                flask.g.new_cart_cookie = (cart_uuid, cart_id)
+                mark_cart_valid(cart_id)
+        cart_ids['cookie'] = cart_id
+    return cart_ids['cookie']
+
+
+def create_cookie_cart():
+    cart_uuid = str(uuid.uuid4())
+    flask.g.cursor.execute('INSERT INTO carts (uuid, userId, lastModTime) VALUES (%s, %s, %s)', (cart_uuid, None, int(time.time())))
+    flask.g.conn.commit()
+    cart_id = flask.g.cursor.lastrowid
+    flask.g.new_cart_cookie = (cart_uuid, cart_id)
+    flask.g.setdefault('cart_ids', {})['cookie'] = cart_id
+    mark_cart_valid(cart_id)
+    return cart_id
 
-    # if user is logged in, check if there is only one cart for user and if not, delete the old one/s and create a new one
+
+def get_cart_id():
+    #cart of the current visitor, user cart for logged in users and cookie cart otherwise
     if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT COUNT(*) FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        if flask.g.cursor.fetchone()['COUNT(*)'] != 1:
-            flask.g.cursor.execute('DELETE FROM carts WHERE userId = %s', (flask.session['user_id'],))
-            flask.g.conn.commit()
-            flask.g.cursor.execute('INSERT INTO carts (userId, lastModTime) VALUES (%s, %s)', (flask.session['user_id'], int(time.time())))
-            flask.g.conn.commit()
+        return get_user_cart_id(flask.session['user_id'])
+    return get_cookie_cart_id()
 
-    # create new uuid cart if there is NO cart cookie
-    elif (not cart_cookie):
-        cart_uuid = str(uuid.uuid4())
-        flask.g.cursor.execute('INSERT INTO carts (uuid, userId, lastModTime) VALUES (%s, %s, %s)', (cart_uuid, None, int(time.time())))
-        flask.g.conn.commit()
-        response.set_cookie(config['COOKIE_NAMES']['cart'], cart_uuid, expires=datetime.datetime.now() + datetime.timedelta(days=365*10), path='/')
 
-    # if there is a cart cookie, check if it is valid and if not, create a new one
-    else:
-        flask.g.cursor.execute('SELECT COUNT(*) FROM carts WHERE uuid = %s', (cart_cookie,))
-        if not flask.g.cursor.fetchone()['COUNT(*)']:
-            cart_uuid = str(uuid.uuid4())
-            flask.g.cursor.execute('INSERT INTO carts (uuid, userId, lastModTime) VALUES (%s, %s, %s)', (cart_uuid, None, int(time.time())))
-            flask.g.conn.commit()
-            response.set_cookie(config['COOKIE_NAMES']['cart'], cart_uuid, expires=datetime.datetime.now() + datetime.timedelta(days=365*10), path='/')
-        
+def mark_cart_valid(cart_id):
+    flask.g.setdefault('valid_cart_ids', set()).add(cart_id)
+
+
+def is_cart_valid(cart_id):
+    #ids from the session or the signed cookie are not checked on page views, changes check that the cart still exists
+    if cart_id in flask.g.get('valid_cart_ids', set()):
+        return True
+    flask.g.cursor.execute('SELECT id FROM carts WHERE id = %s', (cart_id,))
+    if flask.g.cursor.fetchone() == None:
+        return False
+    mark_cart_valid(cart_id)
+    return True
+
+
+def get_or_create_cart_id():
+    #carts are created on the first change only, so page views (and bots) never create empty carts,
+    #expired cookie carts and user carts removed by migration 0006 are replaced with a new (or the existing) cart
+    cart_id = get_cart_id()
+    if (cart_id != None) and is_cart_valid(cart_id):
+        return cart_id
+    if flask.session.get('logged'):
+        return create_user_cart(flask.session['user_id'])
+    return create_cookie_cart()
+
 
 def get_cart_products():
     cart_products = []
-    if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT * FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        user_cart_id = flask.g.cursor.fetchone()['id']
-        flask.g.cursor.execute('SELECT * FROM cartProducts WHERE cartId = %s', (user_cart_id,))
-        cart_products = flask.g.cursor.fetchall()
-    else:
-        try:
-            cart_uuid = flask.request.cookies.get(config['COOKIE_NAMES']['cart'])
-            flask.g.cursor.execute('SELECT * FROM carts WHERE uuid = %s', (cart_uuid,))
-            cookie_cart_id = flask.g.cursor.fetchone()['id']
-            flask.g.cursor.execute('SELECT * FROM cartProducts WHERE cartId = %s', (cookie_cart_id,))
-            cart_products = flask.g.cursor.fetchall()
-        except Exception as e:
-            cart_products = []
+    cart_id = get_cart_id()
+    if cart_id != None:
+        cart_products = flaskr.cart_store.get_items(cart_id)
 
     db_cart_products = []
-    for cart_product in cart_products:
-        flask.g.cursor.execute('SELECT * FROM products WHERE id = %s', (cart_product['productId'],))
-        product = flask.g.cursor.fetchone()
+    products = flaskr.products.get_many([cart_product['productId'] for cart_product in cart_products])
+    for cart_product, product in zip(cart_products, products):
+        if product is None:
+            continue
         db_cart_products.append({
             'id': cart_product['productId'],
             'amount': cart_product['amount'],
             'name': product['name'],
+            'slug': product['slug'],
             'price': product['priceNet'],
+            'priceGross': product['priceGross'],
             'vatRate': product['vatRate'],
             'EAN': product['ean'],
             'stock': product['stock'],
@@ -210,28 +374,45 @@ def get_cart_products():
     flask.g.cart_products = db_cart_products
 
 
+def touch_cart_version():
+    #cart version is a part of conditional GET etags (see conditional.py), call it after every change of the cart
+    flask.session['cart_version'] = time.time_ns()
+
+
 def migrate_cart(migration_type):
+    touch_cart_version()
     try:
-        cookie_cart_uuid = flask.request.cookies.get(config['COOKIE_NAMES']['cart'])
-        flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (cookie_cart_uuid,))
-        cookie_cart_id = flask.g.cursor.fetchone()['id']
-        flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        user_cart_id = flask.g.cursor.fetchone()['id']
+        cookie_cart_id = get_cookie_cart_id()
+        user_cart_id = get_user_cart_id(flask.session['user_id'])
+        if migration_type == 'cookie->user':
+            source_cart_id, target_cart_id = cookie_cart_id, user_cart_id
+        elif migration_type == 'user->cookie':
+            source_cart_id, target_cart_id = user_cart_id, cookie_cart_id
+
+        #live carts are written to mysql first and the target is dropped after the migration, so it is loaded again from cartProducts
+        for cart_id in [source_cart_id, target_cart_id]:
+            if cart_id != None:
+                flaskr.cart_store.flush(cart_id)
 
         if migration_type == 'cookie->user':
-            delete_cart_id = user_cart_id
-            direction_tuple = (user_cart_id, cookie_cart_id)
-            flask.g.cursor.execute('SELECT COUNT(*) FROM cartProducts WHERE cartId = %s', (cookie_cart_id,))
+            if source_cart_id == None:
+                return
+            flask.g.cursor.execute('SELECT COUNT(*) FROM cartProducts WHERE cartId = %s', (source_cart_id,))
             if not flask.g.cursor.fetchone()['COUNT(*)']:
                 return
-        elif migration_type == 'user->cookie':
-            delete_cart_id = cookie_cart_id
-            direction_tuple = (cookie_cart_id, user_cart_id)
 
-        flask.g.cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (delete_cart_id,))
-        flask.g.conn.commit()
-        flask.g.cursor.execute('INSERT INTO cartProducts (cartId, productId, amount) SELECT %s, productId, amount FROM cartProducts WHERE cartId = %s', direction_tuple)
+        #carts that do not exist (yet or any more) are created only when there is something to copy into them
+        if (target_cart_id == None) or (not is_cart_valid(target_cart_id)):
+            if source_cart_id == None:
+                return
+            target_cart_id = create_user_cart(flask.session['user_id']) if migration_type == 'cookie->user' else create_cookie_cart()
+
+        flask.g.cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (target_cart_id,))
         flask.g.conn.commit()
+        if source_cart_id != None:
+            flask.g.cursor.execute('INSERT INTO cartProducts (cartId, productId, amount) SELECT %s, productId, amount FROM cartProducts WHERE cartId = %s', (target_cart_id, source_cart_id))
+            flask.g.conn.commit()
+        flaskr.cart_store.drop(target_cart_id)
 
     except Exception as e:
         print(traceback.format_exc())
@@ -6,6 +6,7 @@ import os
 import flask
 import dotenv
 import configparser
+import flaskr.conditional
 import logging
 
 dotenv.load_dotenv()
@@ -20,5 +21,6 @@ bp = flask.Blueprint('index', __name__, url_prefix='/')
 
 
 @bp.route('', methods=['GET'])
+@flaskr.conditional.conditional(flaskr.conditional.template_validator('index.html'))
 def main():
     return flask.render_template('index.html')
\ No newline at end of file
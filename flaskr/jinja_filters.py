@@ -6,8 +6,11 @@ import unicodedata
 import re
 import json
 import datetime
+import functools
 
 
+#product slugs are stored in the database, memo is for the remaining uses (category and product names in templates)
+@functools.lru_cache(maxsize=20000)
 def slugify(value):
     value = str(unicodedata.normalize('NFKD', value).encode('ascii', 'ignore'), 'ascii')
     value = re.sub(r'[^\w\s-]', '', value).strip().lower()
@@ -0,0 +1,54 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import flask
+import flask.ctx
+import traceback
+import flaskr.functions
+import flaskr.query_stats
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_conn():
+    return flaskr.functions.connect_db()
+
+
+def load_cursor():
+    return flaskr.query_stats.wrap_cursor(flask.g.conn.cursor(dictionary=True))
+
+
+def load_redis_client():
+    return flaskr.functions.connect_redis()
+
+
+def load_cart_products():
+    try:
+        flaskr.functions.get_cart_products()
+        return flask.g.cart_products
+    except Exception as e:
+        logger.error(f'Could not load cart products: {e}\n{traceback.format_exc()}')
+        return []
+
+
+LOADERS = {
+    'conn': load_conn,
+    'cursor': load_cursor,
+    'redis_client': load_redis_client,
+    'cart_products': load_cart_products,
+}
+
+
+class LazyGlobals(flask.ctx._AppCtxGlobals):
+    #flask.g which opens db/redis and loads the cart only when a view or template asks for it
+    #__getattr__ is called only for attributes that are not set yet, so every resource is loaded at most once per request
+    def __getattr__(self, name):
+        loader = LOADERS.get(name)
+        if loader is None:
+            return super().__getattr__(name)
+        value = loader()
+        setattr(self, name, value)
+        return value
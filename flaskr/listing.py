@@ -0,0 +1,152 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import json
+import flask
+import dotenv
+import configparser
+import flaskr.pagination
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+LISTING_COLUMNS = ['listingMatch', 'listingTotal', 'listingTotalWithFilters', 'listingMaxPriceGross', 'listingRowNumber', 'listingSentinel']
+
+
+def category_where(category_ids):
+    #category_ids is a list of ids, empty list means the whole shop
+    if not category_ids:
+        return '1 = 1', ()
+    return f"categoryId IN ({', '.join(['%s'] * len(category_ids))})", tuple(category_ids)
+
+
+def filters_where(user_config):
+    #availability and price filter from the user preferences cookie, returned as sql condition and its params
+    conditions = []
+    params = []
+
+    if user_config['availability'] == 'available':
+        conditions.append('stock > 0')
+    elif user_config['availability'] == 'not-available':
+        conditions.append('stock = 0')
+    else:
+        conditions.append('stock >= 0')
+
+    if user_config['price_filter'] == 'on':
+        try:
+            price_from, price_to = [float(value) for value in user_config['price_filter_values'].split('to')]
+            conditions.append('priceGross >= %s AND priceGross <= %s')
+            params += [price_from, price_to]
+        except (AttributeError, ValueError):
+            pass
+
+    return ' AND '.join(conditions), tuple(params)
+
+
+def sorting_query(user_config):
+    return json.loads(config['USER_PREF_COOKIE']['sorting_option_queries'])[user_config['sorting_option']]
+
+
+def sort_column(user_config):
+    return flaskr.pagination.parse_sort(sorting_query(user_config))
+
+
+def fetch_listing(base_where, base_params, user_config, limit, offset):
+    #single statement returning the requested page together with both totals and max gross price of the filtered set
+    #one row of the unfiltered set (listingSentinel) is always returned, so totals are known even when the page is empty
+    #window functions run over ids only (stock, price and the sort column are read but not kept), full rows are joined
+    #for the rows of the page and the sentinel only, so large categories do not materialise and sort whole products
+    filter_sql, filter_params = filters_where(user_config)
+    order_sql = flaskr.pagination.order_by(*sort_column(user_config))
+
+    flask.g.cursor.execute(f'''
+        SELECT products.*, listing.listingMatch, listing.listingTotal, listing.listingTotalWithFilters,
+            listing.listingMaxPriceGross, listing.listingRowNumber, listing.listingSentinel
+        FROM (
+            SELECT id,
+                ({filter_sql}) AS listingMatch,
+                COUNT(*) OVER () AS listingTotal,
+                SUM({filter_sql}) OVER () AS listingTotalWithFilters,
+                MAX(CASE WHEN {filter_sql} THEN priceGross END) OVER () AS listingMaxPriceGross,
+                ROW_NUMBER() OVER (PARTITION BY ({filter_sql}) {order_sql}) AS listingRowNumber,
+                ROW_NUMBER() OVER () AS listingSentinel
+            FROM products WHERE {base_where}
+        ) listing
+        JOIN products ON products.id = listing.id
+        WHERE (listing.listingMatch = 1 AND listing.listingRowNumber > %s AND listing.listingRowNumber <= %s) OR listing.listingSentinel = 1
+        ORDER BY listing.listingMatch DESC, listing.listingRowNumber
+    ''', filter_params * 4 + tuple(base_params) + (offset, offset + limit))
+    rows = flask.g.cursor.fetchall()
+
+    listing = {
+        'products': [],
+        'total_products': 0,
+        'total_products_with_filters': 0,
+        'max_price_gross': 0,
+    }
+    if rows:
+        listing['total_products'] = int(rows[0]['listingTotal'])
+        listing['total_products_with_filters'] = int(rows[0]['listingTotalWithFilters'] or 0)
+        listing['max_price_gross'] = rows[0]['listingMaxPriceGross'] or 0
+
+    for row in rows:
+        if row['listingMatch'] and (offset < row['listingRowNumber'] <= offset + limit):
+            for column in LISTING_COLUMNS:
+                del row[column]
+            listing['products'].append(row)
+
+    return listing
+
+
+def fetch_totals(base_where, base_params, user_config):
+    filter_sql, filter_params = filters_where(user_config)
+    flask.g.cursor.execute(f'''
+        SELECT COUNT(*) AS total,
+            SUM({filter_sql}) AS totalWithFilters,
+            MAX(CASE WHEN {filter_sql} THEN priceGross END) AS maxPriceGross
+        FROM products WHERE {base_where}
+    ''', filter_params * 2 + tuple(base_params))
+    totals = flask.g.cursor.fetchone()
+
+    return {
+        'total_products': int(totals['total']),
+        'total_products_with_filters': int(totals['totalWithFilters'] or 0),
+        'max_price_gross': totals['maxPriceGross'] or 0,
+    }
+
+
+def fetch_page_keyset(base_where, base_params, user_config, limit, seek):
+    #page after the seek position, cost does not depend on how deep the page is
+    filter_sql, filter_params = filters_where(user_config)
+    column, direction = sort_column(user_config)
+    seek_sql, seek_params = flaskr.pagination.seek_where(column, direction, seek)
+    flask.g.cursor.execute(f'''
+        SELECT * FROM products
+        WHERE {base_where} AND {filter_sql} AND {seek_sql}
+        {flaskr.pagination.order_by(column, direction)}
+        LIMIT %s
+    ''', tuple(base_params) + filter_params + seek_params + (limit,))
+
+    return flask.g.cursor.fetchall()
+
+
+def fetch_page(base_where, base_params, user_config, limit, offset):
+    #page only, used when totals come from the facet cache
+    filter_sql, filter_params = filters_where(user_config)
+    flask.g.cursor.execute(f'''
+        SELECT * FROM products
+        WHERE {base_where} AND {filter_sql}
+        {flaskr.pagination.order_by(*sort_column(user_config))}
+        LIMIT %s OFFSET %s
+    ''', tuple(base_params) + filter_params + (limit, offset))
+
+    return flask.g.cursor.fetchall()
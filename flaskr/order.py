@@ -9,6 +9,8 @@ import dotenv
 import configparser
 import json
 import flaskr.functions
+import flaskr.products
+import flaskr.cart_store
 import time
 import uuid
 import re
@@ -50,11 +52,7 @@ def order_checkout(draft_order_uuid, shipping_method_uuid):
     
     order_products = json.loads(draft_order['products'])
 
-    products_data = []
-    for product in order_products:
-        flask.g.cursor.execute('SELECT * from products WHERE id = %s', (product['productId'],))
-        product_data = flask.g.cursor.fetchone()
-        products_data.append(product_data)
+    products_data = flaskr.products.get_many([product['productId'] for product in order_products])
 
     flask.g.cursor.execute('SELECT * FROM paymentMethods')
     payment_methods = flask.g.cursor.fetchall()
@@ -188,15 +186,11 @@ def finalize_order():
     flask.g.redis_client.lpush(config['REDIS_QUEUES']['email_queue'], json.dumps(email_data))
 
     #truncate cart on successfull checkout
-    if flask.session.get('logged'):
-        flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (flask.session['user_id'],))
-        cart_id = flask.g.cursor.fetchone()['id']
-    else:
-        flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (flask.request.cookies.get(config['COOKIE_NAMES']['cart']),))
-        cart_id = flask.g.cursor.fetchone()['id']
-    flask.g.cursor.execute('UPDATE carts SET lastModTime = %s WHERE id = %s', (int(time.time()), cart_id))
-    flask.g.cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (cart_id,))
-    flask.g.conn.commit()
+    cart_id = flaskr.functions.get_cart_id()
+    if cart_id != None:
+        flaskr.cart_store.remove(cart_id)
+        flaskr.cart_store.flush(cart_id)
+    flaskr.functions.touch_cart_version()
 
     resp = {
         'ouuid': order_uuid
@@ -276,9 +270,8 @@ def order_details(order_uuid):
 
     #get order products data
     order['products'] = json.loads(order['products'])
-    for product in order['products']:
-        flask.g.cursor.execute('SELECT * FROM products WHERE id = %s', (product['productId'],))
-        product_data = flask.g.cursor.fetchone()
+    products_data = flaskr.products.get_many([product['productId'] for product in order['products']])
+    for product, product_data in zip(order['products'], products_data):
         product.update({'priceNet': product_data['priceNet'], 'vatRate': product_data['vatRate'], 'name': product_data['name'], 'productId': product_data['id'], 'productEan': product_data['ean']})
 
     #get order date
@@ -341,24 +334,16 @@ def download_invoice(invoice_uuid):
 
 def create_draft_order(shipping_methods):
     try:
-        if flask.session.get('logged'):
-            user_id = flask.session['user_id']
-        else:
-            user_id = None
-
-        if user_id is not None:
-            flask.g.cursor.execute('SELECT id FROM carts WHERE userId = %s', (user_id,))
-            cart_id = flask.g.cursor.fetchone()['id']
-        else:
-            flask.g.cursor.execute('SELECT id FROM carts WHERE uuid = %s', (flask.request.cookies.get(config['COOKIE_NAMES']['cart']),))
-            cart_id = flask.g.cursor.fetchone()['id']
+        cart_id = flaskr.functions.get_cart_id()
+        if cart_id == None:
+            return False
 
+        flaskr.cart_store.flush(cart_id)
         flask.g.cursor.execute('SELECT * FROM cartProducts WHERE cartId = %s', (cart_id,))
         cart_products = flask.g.cursor.fetchall()
 
-        for product in cart_products:
-            flask.g.cursor.execute('SELECT * from products WHERE id = %s', (product['productId'],))
-            product_data = flask.g.cursor.fetchone()
+        products_data = flaskr.products.get_many([product['productId'] for product in cart_products], fresh=True)
+        for product, product_data in zip(cart_products, products_data):
             product.update({'priceNet': product_data['priceNet'], 'vatRate': product_data['vatRate'], 'name': product_data['name'], 'productId': product_data['id']})
             del product['id']
 
@@ -0,0 +1,269 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import re
+import time
+import json
+import base64
+import hashlib
+import threading
+import urllib.parse
+import collections
+from functools import wraps
+import flask
+import markupsafe
+import dotenv
+import configparser
+import flaskr.functions
+import flaskr.static_cache
+import flaskr.redis_pool
+import flaskr.cache_sync
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+HOLE_MARKER = re.compile(rb'<!--page-cache-hole:([\w-]+)-->')
+SKIPPED_HEADERS = ['Content-Length', 'X-Page-Cache']
+#flask.g attributes set (or lazily loaded, see lazy_globals.py) only for the current visitor
+PER_VISITOR_GLOBALS = ['csrf_token', 'cart_products']
+
+STATS = {'hits': 0, 'misses': 0, 'stores': 0, 'not_stored': 0, 'bypassed': 0}
+_stats_lock = threading.Lock()
+
+
+def count(name):
+    with _stats_lock:
+        STATS[name] += 1
+
+
+class RedisBackend:
+    #shared by all workers, every tag is a redis set with keys of the pages that depend on it
+    #entries are stored as JSON (body base64 encoded), nothing read from redis is ever unpickled
+    def get(self, key):
+        value = flaskr.redis_pool.get_client().get(key)
+        if not value:
+            return None
+        entry = json.loads(value)
+        return {'body': base64.b64decode(entry['body']), 'status': entry['status'], 'headers': [tuple(header) for header in entry['headers']]}
+
+    def set(self, key, entry, ttl, tags):
+        value = json.dumps({'body': base64.b64encode(entry['body']).decode(), 'status': entry['status'], 'headers': entry['headers']})
+        pipe = flaskr.redis_pool.get_client().pipeline(transaction=False)
+        pipe.set(key, value, ex=ttl)
+        for tag in tags:
+            pipe.sadd(get_tag_key(tag), key)
+            pipe.expire(get_tag_key(tag), ttl)
+        pipe.execute()
+
+    def invalidate_tags(self, tags, redis_client=None):
+        redis_client = redis_client or flaskr.redis_pool.get_client()
+        pipe = redis_client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.smembers(get_tag_key(tag))
+        keys = set()
+        for members in pipe.execute():
+            keys.update(members)
+        redis_client.delete(*keys, *[get_tag_key(tag) for tag in tags])
+
+
+class MemoryBackend:
+    #per worker, bounded by max_entries (oldest entries are dropped first), tags are invalidated through cache_sync events
+    #every entry keeps its tags, so dropped, expired and evicted keys are removed from the tag sets as well
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item == None:
+                return None
+            expires, entry, tags = item
+            if expires < time.monotonic():
+                self.drop(key)
+                return None
+            return entry
+
+    def set(self, key, entry, ttl, tags):
+        with self.lock:
+            self.drop(key)
+            self.entries[key] = (time.monotonic() + ttl, entry, list(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self.drop(next(iter(self.entries)))
+
+    def drop(self, key):
+        #called with the lock held
+        item = self.entries.pop(key, None)
+        if item == None:
+            return
+        for tag in item[2]:
+            keys = self.tags.get(tag)
+            if keys != None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def invalidate_tags(self, tags, redis_client=None):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, set())):
+                    self.drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+
+def is_enabled():
+    return int(config['PAGE_CACHE']['enabled']) == 1
+
+
+def get_backend_name():
+    return config['PAGE_CACHE']['backend']
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend == None:
+        if get_backend_name() == 'memory':
+            _backend = MemoryBackend(int(config['PAGE_CACHE']['memory_max_entries']))
+        else:
+            _backend = RedisBackend()
+    return _backend
+
+
+def get_tag_key(tag):
+    return f"{config['REDIS_QUEUES']['page_cache']}:tag:{tag}"
+
+
+def get_key(name):
+    #page is the same for every anonymous visitor with the same path, page parameter and decoded preferences cookie
+    #shop turns the price filter off when the referrer is another page, so that is part of the key as well
+    user_config = flaskr.functions.get_config_cookie(flask.request)
+    try:
+        same_referrer = urllib.parse.unquote(flask.request.base_url) == urllib.parse.unquote(flask.request.referrer.split('?')[0])
+    except Exception:
+        same_referrer = False
+    raw_key = '|'.join([name, flask.request.path, flask.request.args.get('s', ''), user_config['config_cookie'], str(same_referrer)])
+    return f"{config['REDIS_QUEUES']['page_cache']}:{flaskr.static_cache.VERSION}:{hashlib.sha256(raw_key.encode()).hexdigest()}"
+
+
+def is_cacheable_request():
+    return is_enabled() and flask.request.method == 'GET' and not flask.session.get('logged')
+
+
+def is_safe_to_store(response):
+    #pages with per-visitor data rendered in (csrf token or cart outside of a hole, session changes) are never stored,
+    #called right after rendering, before the holes are filled
+    if any(name in flask.g for name in PER_VISITOR_GLOBALS):
+        return False
+    return (response.status_code == 200) and (not flask.session.modified)
+
+
+def set_tags(*tags):
+    #called by cached views, invalidate_tags() drops every page rendered with any of these tags
+    flask.g.page_cache_tags = list(tags)
+
+
+def hole(name):
+    #jinja global: {{ page_cache_hole('cart') }} renders the fragment template for name, cached pages keep a marker instead
+    if flask.g.get('page_cache_rendering'):
+        return markupsafe.Markup(f'<!--page-cache-hole:{name}-->')
+    return markupsafe.Markup(render_hole(name))
+
+
+def render_hole(name):
+    templates = dict(item.split(':') for item in flaskr.functions.get_config_list('str', config['PAGE_CACHE']['hole_templates']))
+    return flask.render_template(templates[name])
+
+
+def fill_holes(response):
+    body = response.get_data()
+    if b'<!--page-cache-hole:' in body:
+        response.set_data(HOLE_MARKER.sub(lambda match: render_hole(match.group(1).decode()).encode(), body))
+    return response
+
+
+def cached(name):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not is_cacheable_request():
+                count('bypassed')
+                return f(*args, **kwargs)
+
+            key = get_key(name)
+            try:
+                entry = get_backend().get(key)
+            except Exception as e:
+                logger.warning(f'Page cache read failed: {e}')
+                entry = None
+
+            if entry != None:
+                count('hits')
+                response = flask.Response(entry['body'], status=entry['status'], headers=entry['headers'])
+                response.headers['X-Page-Cache'] = 'HIT'
+                return fill_holes(response)
+
+            count('misses')
+            flask.g.page_cache_rendering = True
+            try:
+                response = flask.make_response(f(*args, **kwargs))
+            finally:
+                flask.g.page_cache_rendering = False
+
+            if is_safe_to_store(response):
+                entry = {
+                    'body': response.get_data(),
+                    'status': response.status_code,
+                    'headers': [(header, value) for header, value in response.headers.items() if header not in SKIPPED_HEADERS],
+                }
+                try:
+                    get_backend().set(key, entry, int(config['PAGE_CACHE'][f'ttl_{name}']), flask.g.get('page_cache_tags', []))
+                    count('stores')
+                except Exception as e:
+                    logger.warning(f'Page cache write failed: {e}')
+            else:
+                count('not_stored')
+
+            response.headers['X-Page-Cache'] = 'MISS'
+            return fill_holes(response)
+        return decorated_function
+    return decorator
+
+
+def invalidate_tags(tags, redis_client=None):
+    #shared redis entries are dropped right away, per worker memory entries through the cache_sync event
+    if not tags:
+        return
+    if get_backend_name() == 'memory':
+        flaskr.cache_sync.publish('page_cache', {'tags': list(tags)})
+    else:
+        get_backend().invalidate_tags(tags, redis_client)
+
+
+def handle_page_cache_event(payload):
+    if get_backend_name() == 'memory':
+        get_backend().invalidate_tags(payload['tags'])
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(STATS, backend=get_backend_name())
@@ -0,0 +1,102 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import re
+import decimal
+import hashlib
+import flask
+import itsdangerous
+import dotenv
+import configparser
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+ORDER_BY = re.compile(r'ORDER BY\s+([\w.]+)(?:\s+(ASC|DESC))?', re.IGNORECASE)
+
+
+def keyset_enabled():
+    return int(config['PAGINATION']['keyset_enabled']) == 1
+
+
+def numbered_pages():
+    return int(config['PAGINATION']['numbered_pages'])
+
+
+def parse_sort(order_query, default_column='id'):
+    #"ORDER BY name DESC" -> ('name', 'DESC'), empty sorting option sorts by the tiebreaker only
+    match = ORDER_BY.search(order_query or '')
+    if not match:
+        return default_column, 'ASC'
+    return match.group(1), (match.group(2) or 'ASC').upper()
+
+
+def order_by(column, direction, tiebreaker='id'):
+    #the tiebreaker is always ascending, seek_where() relies on it
+    if column == tiebreaker:
+        return f'ORDER BY {tiebreaker} {direction}'
+    return f'ORDER BY {column} {direction}, {tiebreaker}'
+
+
+def seek_where(column, direction, seek, tiebreaker='id'):
+    #condition selecting rows after the last row of the previous page, (last sort value, last tiebreaker value)
+    last_value, last_id = seek
+    if column == tiebreaker:
+        return f"{tiebreaker} {'<' if direction == 'DESC' else '>'} %s", (last_id,)
+    operator = '<' if direction == 'DESC' else '>'
+    return f'({column} {operator} %s OR ({column} = %s AND {tiebreaker} > %s))', (last_value, last_value, last_id)
+
+
+def row_value(row, column):
+    #"orders.timestamp" is returned by the cursor as "timestamp"
+    value = row[column.split('.')[-1]]
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def get_serializer():
+    return itsdangerous.URLSafeSerializer(flask.current_app.config['SECRET_KEY'], salt='keyset-pagination')
+
+
+def get_scope(*parts):
+    #token is valid only for the listing it was created for (path, sorting, filters...)
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+def resolve_page(scope):
+    #returns (page number, seek) from "s" parameter, seek is None for plain numbered pages
+    s = flask.request.args.get('s', '1')
+    try:
+        page = int(s)
+    except ValueError:
+        if not keyset_enabled():
+            return 1, None
+        try:
+            data = get_serializer().loads(s)
+        except itsdangerous.BadData:
+            flask.abort(404)
+        if data['q'] != scope:
+            #sorting or filters changed since the token was issued, start from the beginning
+            flask.abort(flask.redirect(flask.request.path))
+        return data['p'], (data['v'], data['i'])
+
+    if keyset_enabled() and page > numbered_pages():
+        flask.abort(404)
+    return page, None
+
+
+def next_page_token(scope, page, total_pages, rows, column, tiebreaker='id'):
+    if (not keyset_enabled()) or (not rows) or (page >= total_pages):
+        return None
+    last_row = rows[-1]
+    return get_serializer().dumps({'q': scope, 'p': page + 1, 'v': row_value(last_row, column), 'i': row_value(last_row, tiebreaker)})
@@ -0,0 +1,365 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import time
+import json
+import decimal
+import datetime
+import hashlib
+import threading
+import collections
+import flask
+import dotenv
+import configparser
+import flaskr.jinja_filters
+import flaskr.redis_pool
+import flaskr.cache_sync
+import flaskr.catalog_filter
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+STATS = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0, 'db_loads': 0, 'coalesced': 0}
+_stats_lock = threading.Lock()
+
+
+def count(name, value=1):
+    if value:
+        with _stats_lock:
+            STATS[name] += value
+
+
+class LRUCache:
+    #bounded per worker cache, least recently used entries are dropped first, entries expire after ttl seconds
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item == None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_l1 = None
+_version = None
+#(version, ids) -> threading.Event of the request currently loading these products in this worker
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def is_cache_enabled():
+    return int(config['PRODUCT_CACHE']['enabled']) == 1
+
+
+def get_l1():
+    global _l1
+    if _l1 == None:
+        _l1 = LRUCache(int(config['PRODUCT_CACHE']['l1_max_entries']), int(config['PRODUCT_CACHE']['l1_ttl']))
+    return _l1
+
+
+def get_version():
+    #namespace version, bumped by invalidate_all(), kept up to date by cache_sync events
+    global _version
+    if _version == None:
+        try:
+            _version = flaskr.cache_sync.get_version(config['REDIS_QUEUES']['product_cache_version'])
+        except Exception as e:
+            logger.warning(f'Product cache version read failed: {e}')
+            return 0
+    return _version
+
+
+def get_l2_key(version, product_id):
+    return f"{config['REDIS_QUEUES']['product_cache']}:{version}:{product_id}"
+
+
+def to_product_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_slug(name, product_id):
+    #canonical url slug, stored in products.slug (set it on every insert and change of the name)
+    return f'{flaskr.jinja_filters.slugify(name)}-{product_id}'
+
+
+def get_by_slug(slug):
+    #id is the last part of the slug, so the row comes from the cache by id and the stored slug has to match exactly,
+    #uniqueness of slugs is guaranteed by uq_products_slug index, ids that do not exist are rejected by the catalog filter
+    product_id = to_product_id(slug.split('-')[-1])
+    if not flaskr.catalog_filter.has_product(product_id):
+        return None
+    product = get(product_id)
+    if (product == None) or (product['slug'] != slug):
+        return None
+    return product
+
+
+def get(product_id, fresh=False):
+    return get_many([product_id], fresh)[0]
+
+
+def get_many(product_ids, fresh=False):
+    #rows are returned in the order of product_ids (None for unknown ids)
+    #fresh=True skips the cache, use it where stock or prices are checked before writing (cart, draft orders)
+    ids = [to_product_id(product_id) for product_id in product_ids]
+    unique_ids = list(dict.fromkeys(product_id for product_id in ids if product_id is not None))
+
+    rows_by_id = {}
+    if unique_ids:
+        if fresh or not is_cache_enabled():
+            rows_by_id = load_rows(unique_ids)
+        else:
+            rows_by_id = get_cached_rows(unique_ids)
+
+    return [rows_by_id.get(product_id) for product_id in ids]
+
+
+def find_many(product_ids, eans):
+    #products by id or EAN in one query, always read from mysql (used for stock checks)
+    product_ids = [product_id for product_id in (to_product_id(value) for value in product_ids) if product_id is not None]
+    conditions = []
+    params = []
+    if product_ids:
+        conditions.append(f"id IN ({', '.join(['%s'] * len(product_ids))})")
+        params += product_ids
+    if eans:
+        conditions.append(f"ean IN ({', '.join(['%s'] * len(eans))})")
+        params += eans
+    if not conditions:
+        return []
+    count('db_loads')
+    flask.g.cursor.execute(f"SELECT * FROM products WHERE {' OR '.join(conditions)}", tuple(params))
+    return flask.g.cursor.fetchall()
+
+
+def load_rows(product_ids):
+    #one "WHERE id IN (...)" query for all ids
+    count('db_loads')
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    flask.g.cursor.execute(f'SELECT * FROM products WHERE id IN ({placeholders})', tuple(product_ids))
+    return {row['id']: row for row in flask.g.cursor.fetchall()}
+
+
+def get_cached_rows(product_ids):
+    version = get_version()
+    l1 = get_l1()
+
+    rows_by_id = {}
+    for product_id in product_ids:
+        row = l1.get(product_id)
+        if row != None:
+            rows_by_id[product_id] = row
+    missing_ids = [product_id for product_id in product_ids if product_id not in rows_by_id]
+    count('l1_hits', len(rows_by_id))
+    count('l1_misses', len(missing_ids))
+
+    if missing_ids:
+        l2_rows = get_l2_rows(version, missing_ids)
+        count('l2_hits', len(l2_rows))
+        count('l2_misses', len(missing_ids) - len(l2_rows))
+        rows_by_id.update(l2_rows)
+        missing_ids = [product_id for product_id in missing_ids if product_id not in rows_by_id]
+
+    if missing_ids:
+        rows_by_id.update(load_single_flight(version, missing_ids))
+
+    return rows_by_id
+
+
+def dump_row(row):
+    #l2 rows are JSON (nothing read from redis is unpickled), Decimal and datetime columns are tagged to be restored
+    values = {}
+    for column, value in row.items():
+        if isinstance(value, decimal.Decimal):
+            value = {'decimal': str(value)}
+        elif isinstance(value, datetime.datetime):
+            value = {'datetime': value.isoformat()}
+        values[column] = value
+    return json.dumps(values)
+
+
+def load_row(value):
+    row = json.loads(value)
+    for column, value in row.items():
+        if isinstance(value, dict):
+            row[column] = decimal.Decimal(value['decimal']) if 'decimal' in value else datetime.datetime.fromisoformat(value['datetime'])
+    return row
+
+
+def get_l2_rows(version, product_ids):
+    rows_by_id = {}
+    try:
+        values = flaskr.redis_pool.get_client().mget([get_l2_key(version, product_id) for product_id in product_ids])
+    except Exception as e:
+        logger.warning(f'Product cache read failed: {e}')
+        return rows_by_id
+
+    l1 = get_l1()
+    for product_id, value in zip(product_ids, values):
+        if value:
+            try:
+                rows_by_id[product_id] = load_row(value)
+            except ValueError:
+                #entry written in an older format, loaded from mysql again
+                continue
+            l1.set(product_id, rows_by_id[product_id])
+    return rows_by_id
+
+
+def store_rows(version, rows_by_id):
+    l1 = get_l1()
+    for product_id, row in rows_by_id.items():
+        l1.set(product_id, row)
+    try:
+        ttl = int(config['PRODUCT_CACHE']['l2_ttl'])
+        pipe = flaskr.redis_pool.get_client().pipeline(transaction=False)
+        for product_id, row in rows_by_id.items():
+            pipe.set(get_l2_key(version, product_id), dump_row(row), ex=ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f'Product cache write failed: {e}')
+
+
+def load_single_flight(version, product_ids):
+    #only one loader per set of products runs at a time, threads of this worker wait for its result in l1,
+    #other workers wait for it in l2 (redis lock), after lock_timeout seconds everybody loads on its own
+    flight_key = (version, tuple(sorted(product_ids)))
+    with _inflight_lock:
+        event = _inflight.get(flight_key)
+        is_leader = event == None
+        if is_leader:
+            event = _inflight[flight_key] = threading.Event()
+
+    if not is_leader:
+        count('coalesced')
+        event.wait(int(config['PRODUCT_CACHE']['lock_timeout']))
+        l1 = get_l1()
+        rows_by_id = {product_id: l1.get(product_id) for product_id in product_ids}
+        if all(row != None for row in rows_by_id.values()):
+            return rows_by_id
+        return load_and_store(version, product_ids)
+
+    try:
+        if not acquire_load_lock(version, flight_key[1]):
+            count('coalesced')
+            rows_by_id = wait_for_l2(version, product_ids)
+            if rows_by_id != None:
+                return rows_by_id
+        return load_and_store(version, product_ids)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(flight_key, None)
+        event.set()
+
+
+def load_and_store(version, product_ids):
+    rows_by_id = load_rows(product_ids)
+    store_rows(version, rows_by_id)
+    return rows_by_id
+
+
+def get_lock_key(version, product_ids):
+    ids_hash = hashlib.sha256(','.join(str(product_id) for product_id in product_ids).encode()).hexdigest()[:16]
+    return f"{config['REDIS_QUEUES']['product_cache']}:lock:{version}:{ids_hash}"
+
+
+def acquire_load_lock(version, product_ids):
+    try:
+        return bool(flaskr.redis_pool.get_client().set(get_lock_key(version, product_ids), os.getpid(), nx=True, ex=int(config['PRODUCT_CACHE']['lock_timeout'])))
+    except Exception:
+        return True
+
+
+def wait_for_l2(version, product_ids):
+    #another worker is loading the same products, poll l2 until they appear or the lock expires
+    deadline = time.monotonic() + int(config['PRODUCT_CACHE']['lock_timeout'])
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        rows_by_id = get_l2_rows(version, product_ids)
+        if len(rows_by_id) == len(product_ids):
+            return rows_by_id
+    return None
+
+
+def invalidate(product_ids, redis_client=None):
+    #drops products from redis right away and from l1 of every worker through cache_sync event
+    product_ids = [to_product_id(product_id) for product_id in product_ids]
+    if not product_ids:
+        return
+    version = get_version()
+    (redis_client or flaskr.redis_pool.get_client()).delete(*[get_l2_key(version, product_id) for product_id in product_ids])
+    flaskr.cache_sync.publish('product_cache', {'ids': product_ids})
+
+
+def invalidate_all():
+    #new namespace version, old l2 entries are left to expire
+    flaskr.cache_sync.publish('product_cache', version_key=config['REDIS_QUEUES']['product_cache_version'])
+
+
+def handle_cache_event(payload):
+    global _version
+    if 'version' in payload:
+        _version = payload['version']
+        get_l1().clear()
+    l1 = get_l1()
+    for product_id in payload.get('ids', []):
+        l1.delete(product_id)
+
+
+def resync_cache():
+    #events could have been missed while the listener was disconnected
+    global _version
+    _version = None
+    get_l1().clear()
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(STATS)
+    for tier in ['l1', 'l2']:
+        lookups = stats[f'{tier}_hits'] + stats[f'{tier}_misses']
+        stats[f'{tier}_hit_ratio'] = round(stats[f'{tier}_hits']/lookups, 4) if lookups else None
+    stats['l1_entries'] = len(get_l1())
+    stats['version'] = _version
+    return stats
@@ -0,0 +1,128 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import re
+import json
+import time
+import flask
+import dotenv
+import configparser
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    #reduce statement to its shape, so the same query with different values is counted as one
+    if isinstance(statement, (bytes, bytearray)):
+        statement = statement.decode('utf-8', 'replace')
+    shape = STRING_LITERAL.sub('?', statement)
+    shape = PLACEHOLDER.sub('?', shape)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    shape = IN_LIST.sub('IN (...)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+class InstrumentedCursor:
+    #wraps mysql cursor and records every statement in flask.g.query_log
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _record(self, statement, start, rows=1):
+        flask.g.query_log.append({
+            'shape': normalize(statement),
+            'ms': round((time.perf_counter() - start)*1000, 3),
+            'rows': rows,
+        })
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._record(operation, start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._record(operation, start, len(seq_params))
+
+
+def is_enabled():
+    return int(config['QUERY_STATS']['enabled']) == 1
+
+
+def wrap_cursor(cursor):
+    if not is_enabled():
+        return cursor
+    flask.g.query_log = []
+    return InstrumentedCursor(cursor)
+
+
+def start_request():
+    flask.g.request_start = time.perf_counter()
+
+
+def finish_request(response):
+    if (not is_enabled()) or ('request_start' not in flask.g):
+        return response
+
+    total_ms = round((time.perf_counter() - flask.g.request_start)*1000, 3)
+    query_log = flask.g.query_log if 'query_log' in flask.g else []
+    db_ms = round(sum(query['ms'] for query in query_log), 3)
+
+    #the same statement shape repeated within one request is almost always a query in a loop
+    shape_counts = {}
+    for query in query_log:
+        shape_counts[query['shape']] = shape_counts.get(query['shape'], 0) + 1
+    n_plus_one = [{'shape': shape, 'count': count} for shape, count in shape_counts.items() if count >= int(config['QUERY_STATS']['n_plus_one_threshold'])]
+
+    if int(config['QUERY_STATS']['server_timing_header']) == 1:
+        server_timing = [f'db;dur={db_ms};desc="{len(query_log)} queries"', f'app;dur={total_ms}']
+        if n_plus_one:
+            server_timing.append(f'n1;desc="{len(n_plus_one)} repeated shapes"')
+        response.headers.add('Server-Timing', ', '.join(server_timing))
+
+    log_data = {
+        'method': flask.request.method,
+        'path': flask.request.path,
+        'endpoint': flask.request.endpoint,
+        'status': response.status_code,
+        'total_ms': total_ms,
+        'db_ms': db_ms,
+        'queries': len(query_log),
+        'n_plus_one': n_plus_one,
+    }
+    if total_ms >= float(config['QUERY_STATS']['slow_request_ms']):
+        log_data['statements'] = query_log
+        logger.warning(f'Slow request {json.dumps(log_data)}')
+    elif n_plus_one:
+        logger.warning(f'Repeated queries {json.dumps(log_data)}')
+    else:
+        logger.info(f'Request {json.dumps(log_data)}')
+
+    return response
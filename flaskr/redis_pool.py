@@ -0,0 +1,120 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import threading
+import redis
+import dotenv
+import configparser
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+#message of redis.ConnectionError raised by BlockingConnectionPool when it waited pool_timeout seconds for a free connection
+POOL_EXHAUSTED_MESSAGE = 'No connection available.'
+
+
+class MeteredConnectionPool(redis.BlockingConnectionPool):
+    #blocking pool which also counts how it is used, redis-py resets it by itself after fork
+    def reset(self):
+        self._stats_lock = threading.Lock()
+        #connections handed out by get_connection, redis-py also releases connections that failed to connect
+        self._checked_out = set()
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'connect_errors': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+        super().reset()
+
+    def get_connection(self, *args, **kwargs):
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as e:
+            #pool exhaustion (no connection freed within pool_timeout) is raised as ConnectionError as well, told apart by its message
+            with self._stats_lock:
+                if str(e) == POOL_EXHAUSTED_MESSAGE:
+                    self._stats['timeouts'] += 1
+                else:
+                    self._stats['connect_errors'] += 1
+            raise
+        with self._stats_lock:
+            self._checked_out.add(connection)
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+        return connection
+
+    def release(self, connection):
+        with self._stats_lock:
+            if connection in self._checked_out:
+                self._checked_out.discard(connection)
+                self._stats['in_use'] -= 1
+        super().release(connection)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pid': self.pid,
+                'max_connections': self.max_connections,
+                'created': len(self._connections),
+                'idle': self.pool.qsize() - (self.max_connections - len(self._connections)),
+                **self._stats,
+                'utilisation': round(self._stats['in_use']/self.max_connections, 3),
+            }
+
+
+_pool = None
+_client = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = MeteredConnectionPool(
+                    host=config['REDIS']['host'],
+                    port=int(config['REDIS']['port']),
+                    db=int(config['REDIS']['db']),
+                    max_connections=int(config['REDIS']['max_connections']),
+                    timeout=float(config['REDIS']['pool_timeout'])
+                )
+    return _pool
+
+
+def get_client():
+    #redis client is thread safe, one shared client per process is enough
+    global _client
+    if _client is None:
+        pool = get_pool()
+        with _lock:
+            if _client is None:
+                _client = redis.Redis(connection_pool=pool)
+    return _client
+
+
+def run_pipeline(commands, transaction=False, redis_client=None):
+    #commands is a list of (method name, args) tuples, ex. [('incr', ('key',)), ('publish', ('channel', 'msg'))]
+    #all of them are sent in a single round trip and the list of results is returned in the same order
+    pipe = (redis_client or get_client()).pipeline(transaction=transaction)
+    for command, args in commands:
+        getattr(pipe, command)(*args)
+    return pipe.execute()
+
+
+def get_pool_stats():
+    if _pool is None:
+        return {}
+    return _pool.stats()
@@ -0,0 +1,82 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import re
+import dotenv
+import configparser
+import flaskr.jinja_filters
+import flaskr.static_cache
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+#static data version -> list of (category id, words of slugs of the category and its ancestors)
+_category_words = {}
+
+
+def get_words(search_query):
+    #casefolded words of the query as typed (FULLTEXT index holds the original names, so "Żółta" -> ['żółta'], not 'zota'),
+    #anything but letters and digits is dropped, which also keeps boolean mode operators out of MATCH
+    words = [word for word in re.split(r'[\W_]+', search_query[:int(config['SEARCH']['max_query_length'])].casefold()) if word]
+    return list(dict.fromkeys(words))[:int(config['SEARCH']['max_words'])]
+
+
+def get_slug_words(words):
+    #category paths are matched in the slug form (lowercase ascii words)
+    slug_words = [slug_word for word in words for slug_word in flaskr.jinja_filters.slugify(word).split('-') if slug_word]
+    return list(dict.fromkeys(slug_words))
+
+
+def get_category_words():
+    #built once per static data version from the category index
+    version = flaskr.static_cache.VERSION
+    if version not in _category_words:
+        category_words = []
+        for category_id, lineage in flaskr.static_cache.CATEGORY_INDEX['ancestors'].items():
+            category_words.append((category_id, set(word for category in lineage for word in category['slug'].split('-'))))
+        _category_words.clear()
+        _category_words[version] = category_words
+    return _category_words[version]
+
+
+def get_matching_category_ids(words):
+    #categories whose path contains every word (as a word prefix), together with all their subcategories
+    words = get_slug_words(words)
+    if not words:
+        return []
+    descendants = flaskr.static_cache.CATEGORY_INDEX['descendants']
+    category_ids = set()
+    for category_id, path_words in get_category_words():
+        if all(any(path_word.startswith(word) for path_word in path_words) for word in words):
+            category_ids.update(descendants.get(category_id, {category_id}))
+    return sorted(category_ids)
+
+
+def search_where(words):
+    #products matching all words in name or EAN (FULLTEXT index) or belonging to a matching category,
+    #returned in the same form as listing.category_where(), so the listing queries are reused as they are
+    selects = []
+    params = []
+
+    fulltext_words = [word for word in words if len(word) >= int(config['SEARCH']['min_word_length'])]
+    if fulltext_words:
+        selects.append('SELECT id FROM products WHERE MATCH(name, EAN) AGAINST (%s IN BOOLEAN MODE)')
+        params.append(' '.join(f'+{word}*' for word in fulltext_words))
+
+    category_ids = get_matching_category_ids(words)
+    if category_ids:
+        selects.append(f"SELECT id FROM products WHERE categoryId IN ({', '.join(['%s'] * len(category_ids))})")
+        params += category_ids
+
+    if not selects:
+        return '1 = 0', ()
+    return f"id IN (SELECT id FROM ({' UNION '.join(selects)}) searchMatch)", tuple(params)
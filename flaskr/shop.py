@@ -6,10 +6,19 @@ import os
 import flask
 import dotenv
 import configparser
-import flaskr.jinja_filters
 import urllib.parse
-import json
 import flaskr.functions
+import flaskr.products
+import flaskr.listing
+import flaskr.pagination
+import flaskr.facets
+import flaskr.search
+import flaskr.suggest
+import flaskr.catalog_filter
+import flaskr.page_cache
+import flaskr.conditional
+import datetime
+import flaskr.static_cache
 import logging
 
 
@@ -28,30 +37,43 @@ bp = flask.Blueprint('shop', __name__, url_prefix=config['ENDPOINTS']['shop'])
 @bp.route('<category>', methods=['GET'], defaults={'sub_category': None, 'subsub_category': None})
 @bp.route('<category>/<sub_category>', methods=['GET'], defaults={'subsub_category': None})
 @bp.route('<category>/<sub_category>/<subsub_category>', methods=['GET'])
+@flaskr.page_cache.cached('shop')
 def shop(category, sub_category, subsub_category):
     #get crucial cookies and parameters
     user_config = flaskr.functions.get_config_cookie(flask.request)
-    page = flask.request.args.get('s', 1, type=int)
 
     #get categories names and ids of children
     active_categories = get_active_categories(category, sub_category, subsub_category)
-    parent_categories_ids = get_parent_categories_ids(active_categories)
+    category_ids = get_category_ids(active_categories)
+    flaskr.page_cache.set_tags(*get_category_tags(active_categories))
+
+    base_where, base_params = flaskr.listing.category_where(category_ids)
+    facet_category_id = active_categories[-1]['id'] if active_categories else None
+
+    return render_listing(user_config, base_where, base_params, active_categories, use_facets=True, facet_category_id=facet_category_id)
+
+
+@bp.route(config['ENDPOINTS']['search'], methods=['GET'])
+def search():
+    #products matching the query in name, EAN or category path, rendered as a regular listing with user preferences
+    user_config = flaskr.functions.get_config_cookie(flask.request)
+    search_query = flask.request.args.get('q', '').strip()
+    words = flaskr.search.get_words(search_query)
+    if not words:
+        return flask.redirect(config['ENDPOINTS']['shop'])
+
+    base_where, base_params = flaskr.search.search_where(words)
+
+    return render_listing(user_config, base_where, base_params, [], use_facets=False, search_query=search_query)
 
-    #get total products in category
-    if parent_categories_ids == '()':
-        flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM products')
-    else:
-        flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM products WHERE categoryId IN {parent_categories_ids}')
-    total_products = flask.g.cursor.fetchone()['total']
-
-    #availability
-    if user_config['availability'] == 'available':
-        availability_query = 'WHERE stock > 0'
-    elif user_config['availability'] == 'not-available':
-        availability_query = 'WHERE stock = 0'
-    else:
-        availability_query = 'WHERE stock >= 0'
 
+@bp.route(config['ENDPOINTS']['suggest'], methods=['GET'])
+def suggest():
+    #typeahead, answered from the in-memory prefix index of every worker
+    return flask.jsonify(flaskr.suggest.suggest(flask.request.args.get('q', '')))
+
+
+def render_listing(user_config, base_where, base_params, active_categories, use_facets, facet_category_id=None, search_query=None):
     #price_filter
     try:
         if urllib.parse.unquote(flask.request.base_url) != urllib.parse.unquote(flask.request.referrer.split('?')[0]):
@@ -59,32 +81,35 @@ def shop(category, sub_category, subsub_category):
     except:
         user_config['price_filter'] = 'off'
 
-    if user_config['price_filter'] == 'on':
-        price_filter_query = f'AND priceNet*(1+vatRate/100) >= {user_config["price_filter_values"].split("to")[0]} AND priceNet*(1+vatRate/100) <= {user_config["price_filter_values"].split("to")[1]}'
+    #page is either a number or a keyset continuation token (see pagination.py)
+    scope = flaskr.pagination.get_scope(flask.request.path, user_config['config_cookie'], user_config['price_filter'], search_query)
+    page, seek = flaskr.pagination.resolve_page(scope)
+    if page < 1:
+        flask.abort(404)
+
+    #get page of products, totals come from the facet cache or, for numbered pages, from the same query as the page
+    offset = (page - 1)*user_config['products_visibility_per_page']
+    if use_facets and flaskr.facets.is_enabled():
+        listing = flaskr.facets.get_counts(facet_category_id, base_where, base_params, user_config)
+    elif seek == None:
+        listing = flaskr.listing.fetch_listing(base_where, base_params, user_config, user_config['products_visibility_per_page'], offset)
     else:
-        price_filter_query = ''
+        listing = flaskr.listing.fetch_totals(base_where, base_params, user_config)
+
+    if seek != None:
+        listing['products'] = flaskr.listing.fetch_page_keyset(base_where, base_params, user_config, user_config['products_visibility_per_page'], seek)
+    elif 'products' not in listing:
+        listing['products'] = flaskr.listing.fetch_page(base_where, base_params, user_config, user_config['products_visibility_per_page'], offset)
+    products = listing['products']
+    total_products = listing['total_products']
+    total_products_with_filters = listing['total_products_with_filters']
+    max_price_gross = listing['max_price_gross']
 
     #pagination
-    if parent_categories_ids == '()':
-        flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM products {availability_query} {price_filter_query}')
-    else:
-        flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM products {availability_query} {price_filter_query} AND categoryId IN {parent_categories_ids}')
-    total_products_with_filters = flask.g.cursor.fetchone()['total']
     total_pages = (total_products_with_filters + user_config['products_visibility_per_page'] - 1)//user_config['products_visibility_per_page']
-    if page < 1 or ((page > total_pages) and (total_pages != 0)):
+    if (page > total_pages) and (total_pages != 0):
         flask.abort(404)
-    offset = (page - 1)*user_config['products_visibility_per_page']
-
-    #get products
-    if parent_categories_ids == '()':
-        flask.g.cursor.execute(f'SELECT * FROM products {availability_query} {price_filter_query} {json.loads(config['USER_PREF_COOKIE']["sorting_option_queries"])[user_config["sorting_option"]]} LIMIT {user_config["products_visibility_per_page"]} OFFSET {offset}')
-    else:
-        flask.g.cursor.execute(f'SELECT * FROM products {availability_query} {price_filter_query} AND categoryId IN {parent_categories_ids} {json.loads(config['USER_PREF_COOKIE']["sorting_option_queries"])[user_config["sorting_option"]]} LIMIT {user_config["products_visibility_per_page"]} OFFSET {offset}')
-    products = flask.g.cursor.fetchall()
-    try:
-        max_price_gross = max(product['priceNet']*(1+product['vatRate']/100) for product in products)
-    except:
-        max_price_gross = 0
+    next_page_token = flaskr.pagination.next_page_token(scope, page, total_pages, products, flaskr.listing.sort_column(user_config)[0])
 
     shop = {
         'sorting_option_names': flaskr.functions.get_config_list('str', config['USER_PREF_COOKIE']['sorting_option_names']),
@@ -103,10 +128,14 @@ def shop(category, sub_category, subsub_category):
         current_availability=user_config['availability'],
         current_page=page,
         total_pages=total_pages,
+        next_page_token=next_page_token,
+        numbered_pages=flaskr.pagination.numbered_pages() if flaskr.pagination.keyset_enabled() else total_pages,
         total_products_with_filters=total_products_with_filters,
         total_products=total_products,
         active_categories=active_categories,
+        search_query=search_query,
         max_price_gross=max_price_gross,
+        availability_counts=listing.get('availability_counts'),
         current_price_filter=user_config['price_filter'],
         current_price_filter_min=user_config['price_filter_values'].split('to')[0],
         current_price_filter_max=user_config['price_filter_values'].split('to')[1],
@@ -117,74 +146,58 @@ def shop(category, sub_category, subsub_category):
     return resp
 
 
+def product_validator(product_slug):
+    #product page changes only with the product row (updatedAt) and static data (category path)
+    product = flaskr.products.get_by_slug(product_slug)
+    if product == None:
+        return None
+    #naive UTC, pool connections use time_zone '+00:00' (see db_pool.py)
+    updated_at = product['updatedAt'].replace(tzinfo=datetime.timezone.utc)
+    return f'{product_slug}:{updated_at.timestamp()}', updated_at
+
+
 @bp.route(f'/{config["ENDPOINTS"]["product"]}/<product_slug>', methods=['GET'])
+@flaskr.conditional.conditional(product_validator)
+@flaskr.page_cache.cached('product')
 def product(product_slug):
-    #read product id from slug
-    product_id = product_slug.split('-')
-    product_id = product_id[len(product_id)-1]
-    
-    #get product details
-    flask.g.cursor.execute('SELECT * FROM products WHERE id = %s', (product_id,))
-    product = flask.g.cursor.fetchone()
+    #get product details, canonical slug is stored with the product
+    product = flaskr.products.get_by_slug(product_slug)
+    if product == None:
+        flask.abort(404)
 
     full_category_path = get_full_category_path(product['categoryId'])
-
-    #check if id is valid for given slug
-    try:
-        if f"{flaskr.jinja_filters.slugify(product['name'])}-{product['id']}" != product_slug:
-            flask.abort(404)
-    except:
-        flask.abort(404)
+    flaskr.page_cache.set_tags(f"product:{product['id']}")
 
     return flask.render_template('shop/product_details.html', product=product, full_category_path=full_category_path)
 
 
 def get_active_categories(category, sub_category, subsub_category):
-    slugs = [category, sub_category, subsub_category]
-    active_categories = []
-    for idx, slug in enumerate(slugs):
-        if idx == 0:
-            if slug != None:
-                flask.g.cursor.execute("SELECT * FROM categories WHERE slug = %s", (slug,))
-                active_categories.append(flask.g.cursor.fetchone())
-        else:
-            if slug != None:
-                flask.g.cursor.execute(f"SELECT * FROM categories WHERE slug = %s AND parentId = {active_categories[idx-1]['id']}", (slug,))
-                active_categories.append(flask.g.cursor.fetchone())
-
-    return active_categories
-
-
-def get_parent_categories_ids(active_categories):
-    parent_ids = []
-    if len(active_categories) == 1:
-        parent_ids.append(active_categories[0]['id'])
-        flask.g.cursor.execute(f"SELECT id FROM categories WHERE parentId = {active_categories[0]['id']}")
-        for id in flask.g.cursor.fetchall():
-            parent_ids.append(id['id'])
-        flask.g.cursor.execute(f"SELECT id FROM categories WHERE parentId IN {str(tuple(parent_ids))}")
-        for id in flask.g.cursor.fetchall():
-            parent_ids.append(id['id'])
-    elif len(active_categories) == 2:
-        parent_ids.append(active_categories[1]['id'])
-        flask.g.cursor.execute(f"SELECT id FROM categories WHERE parentId = {active_categories[1]['id']}")
-        for id in flask.g.cursor.fetchall():
-            parent_ids.append(id['id'])
-    elif len(active_categories) == 3:
-        parent_ids.append(active_categories[2]['id'])
-
-    return str(tuple(parent_ids)).replace(',)', ')')
+    #resolved from the in-memory category index, unknown slug paths are 404
+    slugs = tuple(slug for slug in [category, sub_category, subsub_category] if slug != None)
+    if not slugs:
+        return []
+
+    category_index = flaskr.static_cache.CATEGORY_INDEX
+    active_category = category_index['paths'].get(slugs)
+    if active_category == None:
+        flaskr.catalog_filter.category_rejected()
+        flask.abort(404)
 
+    return list(category_index['ancestors'][active_category['id']])
 
-def get_full_category_path(category_id):
-    parent_categories = []
 
-    while True:
-        flask.g.cursor.execute(f"SELECT * FROM categories WHERE id = {category_id}")
-        category = flask.g.cursor.fetchone()
-        category_id = category['parentId']
-        parent_categories.insert(0, category)
-        if category_id == None:
-            break
+def get_category_ids(active_categories):
+    #ids of the active category and all its subcategories, empty list means the whole shop
+    if len(active_categories) == 0:
+        return []
+
+    return sorted(flaskr.static_cache.CATEGORY_INDEX['descendants'].get(active_categories[-1]['id'], {active_categories[-1]['id']}))
 
-    return parent_categories
\ No newline at end of file
+
+def get_category_tags(active_categories):
+    #cached listing pages are tagged with the category they show, products change listings of all ancestors (see catalog_events.py)
+    return [f"category:{active_categories[-1]['id'] if active_categories else 'all'}"]
+
+
+def get_full_category_path(category_id):
+    return list(flaskr.static_cache.CATEGORY_INDEX['ancestors'].get(category_id, []))
\ No newline at end of file
@@ -1,3 +1,5 @@
 CATEGORIES = []
+CATEGORY_INDEX = {'paths': {}, 'ancestors': {}, 'descendants': {}}
 ERROR_MESSAGES = {}
-SUCCESS_MESSAGES = {}
\ No newline at end of file
+SUCCESS_MESSAGES = {}
+VERSION = 0
\ No newline at end of file
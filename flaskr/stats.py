@@ -0,0 +1,48 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import hmac
+import flask
+import dotenv
+import configparser
+import flaskr.functions
+import flaskr.db_pool
+import flaskr.redis_pool
+import flaskr.page_cache
+import flaskr.products
+import flaskr.catalog_filter
+import logging
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+bp = flask.Blueprint('stats', __name__, url_prefix=config['ENDPOINTS']['stats'])
+
+
+@bp.route('', methods=['GET'])
+def worker_stats():
+    #stats are per worker process, every gunicorn worker answers with its own numbers
+    #behind nginx every request comes from 127.0.0.1, so the STATS_TOKEN header is required as well (endpoint is off without it)
+    stats_token = os.getenv('STATS_TOKEN')
+    if (not stats_token) or (not hmac.compare_digest(flask.request.headers.get('X-Stats-Token', ''), stats_token)):
+        return flask.abort(404)
+    if flask.request.remote_addr not in flaskr.functions.get_config_list('str', config['STATS']['allowed_ips']):
+        return flask.abort(404)
+
+    stats = {
+        'pid': os.getpid(),
+        'db_pool': flaskr.db_pool.get_pool_stats(),
+        'redis_pool': flaskr.redis_pool.get_pool_stats(),
+        'page_cache': flaskr.page_cache.get_stats(),
+        'product_cache': flaskr.products.get_stats(),
+        'catalog_filter': flaskr.catalog_filter.get_stats(),
+    }
+
+    return flask.jsonify(stats)
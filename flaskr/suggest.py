@@ -0,0 +1,207 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import bisect
+import threading
+import dotenv
+import configparser
+import flaskr.jinja_filters
+import flaskr.static_cache
+import flaskr.cache_sync
+import flaskr.functions
+import logging
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+logger = logging.getLogger(__name__)
+
+
+CATEGORY = 0
+PRODUCT = 1
+
+
+class PrefixIndex:
+    #sorted list of (word, id) per kind, a name is found by the start of any of its words ("wie", "udar", "bosch" for
+    #"wiertarka-udarowa-bosch"), queries of more words are checked against the slug, lookups are a bisect over the list
+    #a published index is never changed, events are applied to a copy which replaces it (see handle_suggest_event)
+    def __init__(self):
+        self.words = {CATEGORY: [], PRODUCT: []}
+        self.slugs = {}
+        self.names = {}
+
+    def copy(self):
+        index = PrefixIndex()
+        index.words = {kind: list(entries) for kind, entries in self.words.items()}
+        index.slugs = dict(self.slugs)
+        index.names = dict(self.names)
+        return index
+
+    def add(self, kind, item_id, name, data):
+        slug = flaskr.jinja_filters.slugify(name)
+        for word in set(slug.split('-')):
+            if word:
+                bisect.insort(self.words[kind], (word, item_id))
+        self.slugs[(kind, item_id)] = slug
+        self.names[(kind, item_id)] = data
+
+    def remove(self, kind, item_id):
+        slug = self.slugs.pop((kind, item_id), None)
+        if slug == None:
+            return
+        entries = self.words[kind]
+        for word in set(slug.split('-')):
+            position = bisect.bisect_left(entries, (word, item_id))
+            if position < len(entries) and entries[position] == (word, item_id):
+                del entries[position]
+        self.names.pop((kind, item_id), None)
+
+    def bulk_load(self, items):
+        #items are (kind, id, name, data), sorting once is much faster than inserting one by one
+        for kind, item_id, name, data in items:
+            slug = flaskr.jinja_filters.slugify(name)
+            self.words[kind] += [(word, item_id) for word in set(slug.split('-')) if word]
+            self.slugs[(kind, item_id)] = slug
+            self.names[(kind, item_id)] = data
+        for entries in self.words.values():
+            entries.sort()
+
+    def find(self, prefix, limit, max_scanned):
+        #every kind is scanned until it has limit results or max_scanned entries were examined (short prefixes of
+        #common words, or queries whose later words do not match), so one lookup never walks the whole index
+        prefix = prefix.strip('-')
+        first_word = prefix.split('-')[0]
+        results = {CATEGORY: [], PRODUCT: []}
+        if not first_word:
+            return results
+        for kind, entries in self.words.items():
+            seen = set()
+            position = bisect.bisect_left(entries, (first_word,))
+            end = min(position + max_scanned, len(entries))
+            while (position < end) and (len(results[kind]) < limit):
+                word, item_id = entries[position]
+                if not word.startswith(first_word):
+                    break
+                if (item_id not in seen) and (f"-{self.slugs[(kind, item_id)]}".find(f'-{prefix}') != -1):
+                    seen.add(item_id)
+                    results[kind].append(self.names[(kind, item_id)])
+                position += 1
+        return results
+
+
+#current index, replaced as a whole (never changed in place), so suggest() reads it without locking
+_index = None
+_index_version = None
+#guards replacing the index by events and background builds
+_lock = threading.Lock()
+_building = False
+#events received while a build is running, applied to the new index before it is published
+_pending = []
+
+
+def get_product_data(product):
+    return {'id': product['id'], 'name': product['name'], 'slug': product['slug'], 'url': f"{config['ENDPOINTS']['shop']}{config['ENDPOINTS']['product']}/{product['slug']}"}
+
+
+def get_category_data(lineage):
+    path = '/'.join(category['slug'] for category in lineage)
+    return {'id': lineage[-1]['id'], 'name': lineage[-1]['name'], 'path': path, 'url': f"{config['ENDPOINTS']['shop']}/{path}"}
+
+
+def build_index():
+    #own connection, the index is built outside of requests
+    conn = flaskr.functions.connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('SELECT id, name, slug FROM products')
+        items = [(PRODUCT, product['id'], product['name'], get_product_data(product)) for product in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+    for category_id, lineage in flaskr.static_cache.CATEGORY_INDEX['ancestors'].items():
+        items.append((CATEGORY, category_id, lineage[-1]['name'], get_category_data(lineage)))
+    index = PrefixIndex()
+    index.bulk_load(items)
+    return index
+
+
+def build_in_background():
+    global _index, _index_version, _building
+    try:
+        version = flaskr.static_cache.VERSION
+        index = build_index()
+        with _lock:
+            for payload in _pending:
+                apply_event(index, payload)
+            _index = index
+            _index_version = version
+        logger.info(f'Suggestion index built with {sum(len(entries) for entries in index.words.values())} words')
+    except Exception as e:
+        logger.error(f'Suggestion index build failed: {e}')
+    finally:
+        with _lock:
+            _building = False
+            _pending.clear()
+
+
+def get_index():
+    #built in a background thread on first use in every worker and when static data (categories) change,
+    #the previous index (or no suggestions on startup) is served until the new one is ready, products are updated incrementally
+    global _building
+    if (_index == None) or (_index_version != flaskr.static_cache.VERSION):
+        with _lock:
+            if not _building:
+                _building = True
+                threading.Thread(target=build_in_background, name='suggest-index', daemon=True).start()
+    return _index
+
+
+def suggest(query):
+    prefix = flaskr.jinja_filters.slugify(query[:int(config['SUGGEST']['max_query_length'])]).strip('-')
+    index = get_index()
+    if (len(prefix) < int(config['SUGGEST']['min_query_length'])) or (index == None):
+        return {'categories': [], 'products': []}
+    results = index.find(prefix, int(config['SUGGEST']['max_results']), int(config['SUGGEST']['max_scanned']))
+    return {'categories': results[CATEGORY], 'products': results[PRODUCT]}
+
+
+def products_changed(changes):
+    #publishes new names (and slugs) of inserted, renamed and deleted products, every worker updates its index (see handle_suggest_event)
+    updates = []
+    for old_row, new_row in changes:
+        if (old_row or {}).get('name') != (new_row or {}).get('name'):
+            row = new_row or old_row
+            updates.append({'id': row['id'], 'name': new_row['name'] if new_row else None, 'slug': new_row['slug'] if new_row else None})
+    if updates:
+        flaskr.cache_sync.publish('suggest', {'products': updates})
+
+
+def apply_event(index, payload):
+    for product in payload['products']:
+        index.remove(PRODUCT, product['id'])
+        if product['name'] != None:
+            index.add(PRODUCT, product['id'], product['name'], get_product_data(product))
+
+
+def handle_suggest_event(payload):
+    #changes are applied to a copy of the index, readers keep using the old one until it is replaced
+    global _index
+    with _lock:
+        if _building:
+            _pending.append(payload)
+        if _index == None:
+            return
+        index = _index.copy()
+        apply_event(index, payload)
+        _index = index
+
+
+def resync_index():
+    #events could have been missed while the listener was disconnected, the index is rebuilt in the background
+    global _index_version
+    _index_version = None
@@ -13,6 +13,7 @@ import dotenv
 import configparser
 import werkzeug.security
 import flaskr.static_cache
+import flaskr.pagination
 import logging
 
 
@@ -200,7 +201,8 @@ def change_password():
 @login_required
 def user_orders_list():
     #get crucial parameters
-    page = flask.request.args.get('s', 1, type=int)
+    scope = flaskr.pagination.get_scope(flask.request.path, flask.session['user_id'])
+    page, seek = flaskr.pagination.resolve_page(scope)
 
     #pagination
     flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM orders WHERE userId = %s OR email = %s', (flask.session['user_id'], flask.session['email']))
@@ -208,19 +210,25 @@ def user_orders_list():
     total_pages = (total_orders + int(config["ORDERS"]["order_list_visibility_per_page"]) - 1)//int(config["ORDERS"]["order_list_visibility_per_page"])
     if page < 1 or ((page > total_pages) and (total_pages != 0)):
         flask.abort(404)
-    offset = (page - 1)*int(config["ORDERS"]["order_list_visibility_per_page"])
 
-    flask.g.cursor.execute(f'SELECT * FROM orders WHERE userId = %s OR email = %s ORDER BY timestamp DESC LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])} OFFSET {offset}', (flask.session['user_id'], flask.session['email']))
+    if seek == None:
+        offset = (page - 1)*int(config["ORDERS"]["order_list_visibility_per_page"])
+        flask.g.cursor.execute(f'SELECT * FROM orders WHERE userId = %s OR email = %s {flaskr.pagination.order_by("timestamp", "DESC")} LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])} OFFSET {offset}', (flask.session['user_id'], flask.session['email']))
+    else:
+        seek_sql, seek_params = flaskr.pagination.seek_where('timestamp', 'DESC', seek)
+        flask.g.cursor.execute(f'SELECT * FROM orders WHERE (userId = %s OR email = %s) AND {seek_sql} {flaskr.pagination.order_by("timestamp", "DESC")} LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])}', (flask.session['user_id'], flask.session['email']) + seek_params)
     orders = flask.g.cursor.fetchall()
+    next_page_token = flaskr.pagination.next_page_token(scope, page, total_pages, orders, 'timestamp')
 
-    return flask.render_template('user/orders/orders_list.html', orders=orders, current_page=page, total_pages=total_pages, current_path=flask.request.path)
+    return flask.render_template('user/orders/orders_list.html', orders=orders, current_page=page, total_pages=total_pages, next_page_token=next_page_token, current_path=flask.request.path)
 
 
 @bp.route(config['ENDPOINTS']['invoices'], methods=['GET'])
 @login_required
 def user_invoices_list():
     #get crucial parameters
-    page = flask.request.args.get('s', 1, type=int)
+    scope = flaskr.pagination.get_scope(flask.request.path, flask.session['user_id'])
+    page, seek = flaskr.pagination.resolve_page(scope)
 
     #pagination
     flask.g.cursor.execute(f'SELECT COUNT(*) as total FROM orderInvoices INNER JOIN orders ON orderInvoices.orderId = orders.id WHERE (orders.userId = %s OR orders.email = %s) AND (orderInvoices.invoiceNumber IS NOT NULL)', (flask.session['user_id'], flask.session['email']))
@@ -228,12 +236,18 @@ def user_invoices_list():
     total_pages = (total_invoices + int(config["ORDERS"]["order_list_visibility_per_page"]) - 1)//int(config["ORDERS"]["order_list_visibility_per_page"])
     if page < 1 or ((page > total_pages) and (total_pages != 0)):
         flask.abort(404)
-    offset = (page - 1)*int(config["ORDERS"]["order_list_visibility_per_page"])
 
-    flask.g.cursor.execute(f'SELECT * FROM orderInvoices INNER JOIN orders ON orderInvoices.orderId = orders.id WHERE (orders.userId = %s OR orders.email = %s) AND (orderInvoices.invoiceNumber IS NOT NULL) ORDER BY orders.timestamp DESC LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])} OFFSET {offset}', (flask.session['user_id'], flask.session['email']))
+    #orders.id is selected again as orderRowId, because "id" of the joined row is ambiguous
+    if seek == None:
+        offset = (page - 1)*int(config["ORDERS"]["order_list_visibility_per_page"])
+        flask.g.cursor.execute(f'SELECT *, orders.id AS orderRowId FROM orderInvoices INNER JOIN orders ON orderInvoices.orderId = orders.id WHERE (orders.userId = %s OR orders.email = %s) AND (orderInvoices.invoiceNumber IS NOT NULL) {flaskr.pagination.order_by("orders.timestamp", "DESC", "orders.id")} LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])} OFFSET {offset}', (flask.session['user_id'], flask.session['email']))
+    else:
+        seek_sql, seek_params = flaskr.pagination.seek_where('orders.timestamp', 'DESC', seek, 'orders.id')
+        flask.g.cursor.execute(f'SELECT *, orders.id AS orderRowId FROM orderInvoices INNER JOIN orders ON orderInvoices.orderId = orders.id WHERE (orders.userId = %s OR orders.email = %s) AND (orderInvoices.invoiceNumber IS NOT NULL) AND {seek_sql} {flaskr.pagination.order_by("orders.timestamp", "DESC", "orders.id")} LIMIT {int(config["ORDERS"]["order_list_visibility_per_page"])}', (flask.session['user_id'], flask.session['email']) + seek_params)
     invoices = flask.g.cursor.fetchall()
+    next_page_token = flaskr.pagination.next_page_token(scope, page, total_pages, invoices, 'orders.timestamp', 'orderRowId')
 
-    return flask.render_template('user/orders/invoices_list.html', invoices=invoices, current_page=page, total_pages=total_pages, current_path=flask.request.path)
+    return flask.render_template('user/orders/invoices_list.html', invoices=invoices, current_page=page, total_pages=total_pages, next_page_token=next_page_token, current_path=flask.request.path)
 
 
 def validate_billing_data(data):
@@ -0,0 +1,7 @@
+-- gross price kept by mysql itself, so the shop price filter and price sorting can use an index instead of computing priceNet*(1+vatRate/100) for every row
+-- STORED generated column is calculated for all existing rows while the table is altered (backfill) and on every insert/update later on
+ALTER TABLE products
+    ADD COLUMN priceGross DECIMAL(12,2) AS (ROUND(priceNet*(1+vatRate/100), 2)) STORED;
+
+ALTER TABLE products
+    ADD INDEX idx_products_category_stock_price_gross (categoryId, stock, priceGross);
@@ -0,0 +1,3 @@
+-- last change of a product row, maintained by mysql on every update, used as ETag / Last-Modified of the product page
+ALTER TABLE products
+    ADD COLUMN updatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
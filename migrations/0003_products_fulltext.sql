@@ -0,0 +1,3 @@
+-- inverted index used by the shop search, maintained by mysql on every insert/update of products
+ALTER TABLE products
+    ADD FULLTEXT INDEX ft_products_name_ean (name, EAN);
@@ -0,0 +1,25 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import flaskr.products
+
+
+BATCH_SIZE = 5000
+
+
+def migrate(mydb, cursor):
+    # canonical "name-id" slug of every product, computed by the application and kept unique by the index
+    cursor.execute('ALTER TABLE products ADD COLUMN slug VARCHAR(255) NULL')
+
+    last_id = 0
+    while True:
+        cursor.execute('SELECT id, name FROM products WHERE id > %s ORDER BY id LIMIT %s', (last_id, BATCH_SIZE))
+        products = cursor.fetchall()
+        if not products:
+            break
+        cursor.executemany('UPDATE products SET slug = %s WHERE id = %s', [(flaskr.products.make_slug(product['name'], product['id']), product['id']) for product in products])
+        mydb.commit()
+        last_id = products[-1]['id']
+
+    cursor.execute('ALTER TABLE products MODIFY slug VARCHAR(255) NOT NULL, ADD UNIQUE INDEX uq_products_slug (slug)')
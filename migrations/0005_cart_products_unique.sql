@@ -0,0 +1,18 @@
+-- one row per product in a cart, required by "INSERT ... ON DUPLICATE KEY UPDATE" used for cart changes
+-- existing duplicates are merged first (amounts summed into the oldest row)
+UPDATE cartProducts keepRow
+    JOIN (SELECT MIN(id) AS id, SUM(amount) AS amount FROM cartProducts GROUP BY cartId, productId HAVING COUNT(*) > 1) duplicates ON keepRow.id = duplicates.id
+    SET keepRow.amount = duplicates.amount;
+
+DELETE extraRow FROM cartProducts extraRow
+    JOIN cartProducts keepRow ON extraRow.cartId = keepRow.cartId AND extraRow.productId = keepRow.productId AND extraRow.id > keepRow.id;
+
+ALTER TABLE cartProducts
+    ADD UNIQUE INDEX uq_cart_products_cart_product (cartId, productId);
+
+-- carts.lastModTime is kept by mysql, so cart changes are a single statement
+CREATE TRIGGER trg_cart_products_insert AFTER INSERT ON cartProducts FOR EACH ROW UPDATE carts SET lastModTime = UNIX_TIMESTAMP() WHERE id = NEW.cartId;
+
+CREATE TRIGGER trg_cart_products_update AFTER UPDATE ON cartProducts FOR EACH ROW UPDATE carts SET lastModTime = UNIX_TIMESTAMP() WHERE id = NEW.cartId;
+
+CREATE TRIGGER trg_cart_products_delete AFTER DELETE ON cartProducts FOR EACH ROW UPDATE carts SET lastModTime = UNIX_TIMESTAMP() WHERE id = OLD.cartId;
@@ -0,0 +1,19 @@
+-- one cart per user is enforced by mysql instead of being checked on every request,
+-- user carts are created on the first cart change with INSERT ... ON DUPLICATE KEY UPDATE
+-- existing duplicates are removed first (the most recently changed cart of every user is kept)
+DELETE extraCart FROM carts extraCart
+    JOIN carts keepCart ON extraCart.userId = keepCart.userId
+        AND (extraCart.lastModTime < keepCart.lastModTime OR (extraCart.lastModTime = keepCart.lastModTime AND extraCart.id < keepCart.id));
+
+-- products of removed carts (and of user carts removed by the old init_cart) are deleted with the delete trigger
+-- of migration 0005 dropped, it updates carts, which a statement reading carts may not do (error 1442)
+DROP TRIGGER trg_cart_products_delete;
+
+DELETE cartProducts FROM cartProducts
+    LEFT JOIN carts ON carts.id = cartProducts.cartId
+    WHERE carts.id IS NULL;
+
+CREATE TRIGGER trg_cart_products_delete AFTER DELETE ON cartProducts FOR EACH ROW UPDATE carts SET lastModTime = UNIX_TIMESTAMP() WHERE id = OLD.cartId;
+
+ALTER TABLE carts
+    ADD UNIQUE INDEX uq_carts_user_id (userId);
@@ -0,0 +1,9 @@
+-- time columns used by scripts/expired_db.py, expired rows are deleted in chunks oldest first
+ALTER TABLE carts
+    ADD INDEX idx_carts_last_mod_time (lastModTime);
+
+ALTER TABLE draftOrders
+    ADD INDEX idx_draft_orders_timestamp (timestamp);
+
+ALTER TABLE forgotPassTokens
+    ADD INDEX idx_forgot_pass_tokens_creation_time (creationTime);
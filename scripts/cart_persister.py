@@ -0,0 +1,48 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import sys
+import time
+import traceback
+import dotenv
+import configparser
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+sys.path.append(working_dir)
+import flaskr.functions
+import flaskr.cart_store
+
+
+def persist_dirty_carts(mydb, cursor, redis_client):
+    # write carts changed in redis to carts/cartProducts, returns number of persisted carts
+    cart_ids = redis_client.srandmember(flaskr.cart_store.get_dirty_key(), int(config['CART_STORE']['persist_batch_size']))
+    persisted = 0
+    for cart_id in cart_ids:
+        try:
+            if flaskr.cart_store.persist(mydb, cursor, redis_client, int(cart_id)):
+                persisted += 1
+        except Exception as e:
+            print(f'Cart {int(cart_id)} could not be persisted: {e}')
+            print(traceback.format_exc())
+    return persisted
+
+
+if __name__ == '__main__':
+    # runs only when CART_STORE backend is redis, carts are flushed immediately on login and checkout by the application itself
+    mydb = flaskr.functions.connect_db()
+    cursor = mydb.cursor(dictionary=True)
+    redis_client = flaskr.functions.connect_redis()
+    try:
+        while True:
+            if not persist_dirty_carts(mydb, cursor, redis_client):
+                time.sleep(float(config['CART_STORE']['persist_interval']))
+    finally:
+        cursor.close()
+        mydb.close()
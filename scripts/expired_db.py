@@ -4,6 +4,7 @@
 
 
 import configparser
+import argparse
 import dotenv
 import os
 import sys
@@ -19,40 +20,87 @@ sys.path.append(working_dir)
 import flaskr.functions
 
 
-def delete_expired_forgot_pass_tokens(mydb, cursor):
+#every job deletes at most chunk_size rows per transaction (oldest first, by indexed time column, see migration 0007),
+#so locks are held only for a moment and other queries can run between chunks
+def delete_in_chunks(mydb, cursor, table, time_column, deletion_threshold):
+    chunk_size = int(config['EXPIRED_DB']['chunk_size'])
+    report = {'rows': 0, 'chunks': 0}
+    while True:
+        cursor.execute(f'DELETE FROM {table} WHERE {time_column} <= %s ORDER BY {time_column} LIMIT {chunk_size}', (deletion_threshold,))
+        deleted = cursor.rowcount
+        mydb.commit()
+        report['rows'] += deleted
+        report['chunks'] += 1
+        if deleted < chunk_size:
+            return report
+        time.sleep(float(config['EXPIRED_DB']['chunk_sleep']))
+
+
+def count_expired(cursor, table, time_column, deletion_threshold, condition=''):
+    cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE {time_column} <= %s {condition}', (deletion_threshold,))
+    return {'rows': cursor.fetchone()['COUNT(*)'], 'chunks': 0}
+
+
+def delete_expired_forgot_pass_tokens(mydb, cursor, dry_run):
     # delete forgot password tokens that are expired
     deletion_threshold = int(time.time()) - int(config['AUTH']['forgot_pass_token_expiration_time'])
-    cursor.execute('DELETE FROM forgotPassTokens WHERE creationTime <= %s', (deletion_threshold,))
-    mydb.commit()
+    if dry_run:
+        return count_expired(cursor, 'forgotPassTokens', 'creationTime', deletion_threshold)
+    return delete_in_chunks(mydb, cursor, 'forgotPassTokens', 'creationTime', deletion_threshold)
 
 
-def delete_expired_carts(mydb, cursor):  
-    # delete carts that are expired
+def delete_expired_carts(mydb, cursor, dry_run):
+    # delete carts that are expired (cookie carts only, user carts are kept), products of every chunk of carts go in the same transaction
     deletion_threshold = int(time.time()) - int(config['GLOBAL']['cart_expiration_time'])
-    cursor.execute('SELECT * FROM carts WHERE lastModTime <= %s and uuid is NOT NULL', (deletion_threshold,))
-    carts = cursor.fetchall()
-    for cart in carts:
-        cursor.execute('DELETE FROM cartProducts WHERE cartId = %s', (cart['id'],))
-        cursor.execute('DELETE FROM carts WHERE id = %s', (cart['id'],))
-    mydb.commit()
-
-
-def delete_expired_draft_orders(mydb, cursor):
+    if dry_run:
+        return count_expired(cursor, 'carts', 'lastModTime', deletion_threshold, 'AND uuid IS NOT NULL')
+
+    chunk_size = int(config['EXPIRED_DB']['chunk_size'])
+    report = {'rows': 0, 'chunks': 0, 'cart_products': 0}
+    while True:
+        #rows of the chunk are locked until commit, so carts can not be changed between the check and the deletes
+        #(expiry is not checked again after deleting products, cartProducts triggers bump carts.lastModTime)
+        cursor.execute(f'SELECT id FROM carts WHERE lastModTime <= %s AND uuid IS NOT NULL ORDER BY lastModTime LIMIT {chunk_size} FOR UPDATE', (deletion_threshold,))
+        cart_ids = tuple(cart['id'] for cart in cursor.fetchall())
+        if cart_ids:
+            placeholders = ', '.join(['%s'] * len(cart_ids))
+            cursor.execute(f'DELETE FROM cartProducts WHERE cartId IN ({placeholders})', cart_ids)
+            report['cart_products'] += cursor.rowcount
+            cursor.execute(f'DELETE FROM carts WHERE id IN ({placeholders})', cart_ids)
+            report['rows'] += cursor.rowcount
+        mydb.commit()
+        report['chunks'] += 1
+        if len(cart_ids) < chunk_size:
+            return report
+        time.sleep(float(config['EXPIRED_DB']['chunk_sleep']))
+
+
+def delete_expired_draft_orders(mydb, cursor, dry_run):
     # delete draft orders that are expired
     deletion_threshold = int(time.time()) - int(config['ORDERS']['draft_expiration_time'])
-    cursor.execute('DELETE FROM draftOrders WHERE timestamp <= %s', (deletion_threshold,))
-    mydb.commit()
+    if dry_run:
+        return count_expired(cursor, 'draftOrders', 'timestamp', deletion_threshold)
+    return delete_in_chunks(mydb, cursor, 'draftOrders', 'timestamp', deletion_threshold)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete expired rows (password reset tokens, cookie carts, draft orders) in chunks.')
+    parser.add_argument('--dry-run', action='store_true', help='only count expired rows, nothing is deleted')
+    args = parser.parse_args()
+
     mydb = flaskr.functions.connect_db()
     cursor = mydb.cursor(dictionary=True)
 
-    delete_expired_forgot_pass_tokens(mydb, cursor)
-    delete_expired_carts(mydb, cursor)
-    delete_expired_draft_orders(mydb, cursor)
+    jobs = [delete_expired_forgot_pass_tokens, delete_expired_carts, delete_expired_draft_orders]
+    for job in jobs:
+        start_time = time.perf_counter()
+        report = job(mydb, cursor, args.dry_run)
+        runtime = time.perf_counter() - start_time
+        if args.dry_run:
+            print(f"Dry run: {job.__name__} would delete {report['rows']} rows ({runtime:.2f}s)")
+        else:
+            extra = f", {report['cart_products']} cart products" if 'cart_products' in report else ''
+            print(f"{job.__name__}: {report['rows']} rows deleted{extra} in {report['chunks']} chunks, {runtime:.2f}s")
 
     cursor.close()
     mydb.close()
-
-
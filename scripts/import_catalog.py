@@ -0,0 +1,190 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import sys
+import csv
+import json
+import time
+import decimal
+import argparse
+import itertools
+import dotenv
+import configparser
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+sys.path.append(working_dir)
+import flaskr.functions
+import flaskr.static_cache
+import flaskr.catalog_events
+import flaskr.products
+
+
+#column -> parser, rows may contain any subset of them (ex. id and stock only for stock updates)
+FIELDS = {
+    'name': lambda value: str(value).strip() or None,
+    'ean': lambda value: str(value).strip(),
+    'priceNet': lambda value: decimal.Decimal(str(value)),
+    'vatRate': lambda value: decimal.Decimal(str(value)),
+    'stock': lambda value: int(value),
+    'categoryId': lambda value: int(value),
+    'group': lambda value: str(value).strip(),
+}
+#new products are inserted only when all of these are present
+REQUIRED_FOR_INSERT = ['name', 'ean', 'priceNet', 'vatRate', 'stock', 'categoryId']
+
+
+def read_rows(path, file_format):
+    #generator, the file is never loaded into memory at once
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            for line_number, row in enumerate(csv.DictReader(file), start=2):
+                yield line_number, row
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+def validate_row(row):
+    #returns (product id, {column: value}) or raises ValueError
+    try:
+        product_id = int(row['id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('invalid or missing id')
+    if product_id < 1:
+        raise ValueError('invalid or missing id')
+
+    values = {}
+    for column, parse in FIELDS.items():
+        if (column not in row) or (row[column] in (None, '')):
+            continue
+        try:
+            values[column] = parse(row[column])
+        except (TypeError, ValueError, decimal.InvalidOperation):
+            raise ValueError(f'invalid {column}')
+        if values[column] == None:
+            raise ValueError(f'invalid {column}')
+
+    if values.get('stock', 0) < 0:
+        raise ValueError('negative stock')
+    if (values.get('priceNet', 0) < 0) or (values.get('vatRate', 0) < 0):
+        raise ValueError('negative price or vat rate')
+    if ('categoryId' in values) and (values['categoryId'] not in flaskr.static_cache.CATEGORY_INDEX['ancestors']):
+        raise ValueError('unknown categoryId')
+    if 'name' in values:
+        values['slug'] = flaskr.products.make_slug(values['name'], product_id)
+    return product_id, values
+
+
+def diff_batch(cursor, batch, report):
+    #compares the batch with current rows, returns (updates, inserts, changes for catalog_events)
+    placeholders = ', '.join(['%s'] * len(batch))
+    cursor.execute(f'SELECT * FROM products WHERE id IN ({placeholders})', tuple(batch))
+    current_rows = {row['id']: row for row in cursor.fetchall()}
+
+    updates = {}
+    inserts = []
+    changes = []
+    for product_id, values in batch.items():
+        old_row = current_rows.get(product_id)
+        if old_row:
+            changed = {column: value for column, value in values.items() if old_row[column] != value}
+            if not changed:
+                report['unchanged'] += 1
+                continue
+            #products with the same set of changed columns are updated with one executemany
+            updates.setdefault(tuple(sorted(changed)), []).append((product_id, changed))
+            changes.append((old_row, {**old_row, **changed}))
+        elif all(column in values for column in REQUIRED_FOR_INSERT):
+            inserts.append((product_id, values))
+            changes.append((None, {'id': product_id, **values}))
+        else:
+            report['invalid'] += 1
+            print(f'Product {product_id} does not exist and can not be created without {", ".join(REQUIRED_FOR_INSERT)}')
+
+    return updates, inserts, changes
+
+
+def apply_batch(mydb, cursor, updates, inserts):
+    for columns, rows in updates.items():
+        set_sql = ', '.join(f'`{column}` = %s' for column in columns)
+        cursor.executemany(f'UPDATE products SET {set_sql} WHERE id = %s', [tuple(changed[column] for column in columns) + (product_id,) for product_id, changed in rows])
+
+    columns_by_insert = {}
+    for product_id, values in inserts:
+        columns_by_insert.setdefault(tuple(sorted(values)), []).append((product_id, values))
+    for columns, rows in columns_by_insert.items():
+        columns_sql = ', '.join(f'`{column}`' for column in columns)
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        cursor.executemany(f'INSERT INTO products (id, {columns_sql}) VALUES ({placeholders})', [(product_id,) + tuple(values[column] for column in columns) for product_id, values in rows])
+
+    mydb.commit()
+
+
+def import_catalog(path, file_format, batch_size, dry_run):
+    report = {'read': 0, 'invalid': 0, 'unchanged': 0, 'updated': 0, 'inserted': 0, 'batches': 0}
+    start_time = time.perf_counter()
+
+    mydb = flaskr.functions.connect_db()
+    cursor = mydb.cursor(dictionary=True)
+    redis_client = flaskr.functions.connect_redis()
+    try:
+        rows = read_rows(path, file_format)
+        while True:
+            #bounded batch, later rows of the same product in one batch win
+            batch = {}
+            rows_in_batch = 0
+            for line_number, row in itertools.islice(rows, batch_size):
+                rows_in_batch += 1
+                try:
+                    product_id, values = validate_row(row)
+                except ValueError as e:
+                    report['invalid'] += 1
+                    print(f'Line {line_number}: {e}')
+                    continue
+                batch[product_id] = {**batch.get(product_id, {}), **values}
+            report['read'] += rows_in_batch
+            if rows_in_batch == 0:
+                break
+            if not batch:
+                continue
+
+            updates, inserts, changes = diff_batch(cursor, batch, report)
+            report['updated'] += sum(len(rows) for rows in updates.values())
+            report['inserted'] += len(inserts)
+            report['batches'] += 1
+            if (not dry_run) and changes:
+                apply_batch(mydb, cursor, updates, inserts)
+                flaskr.catalog_events.products_changed(changes, redis_client)
+    finally:
+        cursor.close()
+        mydb.close()
+
+    report['runtime'] = time.perf_counter() - start_time
+    report['rows_per_second'] = report['read']/report['runtime'] if report['runtime'] else 0
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import products and stock levels from CSV or JSONL file (one product per row, identified by id).')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help='detected from the file extension by default')
+    parser.add_argument('--batch-size', type=int, default=int(config['CATALOG_IMPORT']['batch_size']))
+    parser.add_argument('--dry-run', action='store_true', help='validate and diff only, nothing is written')
+    args = parser.parse_args()
+
+    file_format = args.format or ('jsonl' if args.path.endswith(('.jsonl', '.json')) else 'csv')
+
+    #categories are needed for validation and for cache invalidation (see catalog_events.py)
+    flaskr.functions.load_static_data()
+
+    report = import_catalog(args.path, file_format, args.batch_size, args.dry_run)
+    print(f"{'Dry run: ' if args.dry_run else ''}{report['read']} rows read, {report['invalid']} invalid, {report['unchanged']} unchanged, {report['updated']} updated, {report['inserted']} inserted in {report['batches']} batches")
+    print(f"Total runtime {report['runtime']:.2f}s, {report['rows_per_second']:.0f} rows/s")
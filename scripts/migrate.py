@@ -0,0 +1,69 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import sys
+import time
+import importlib.util
+import dotenv
+import configparser
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+sys.path.append(working_dir)
+import flaskr.functions
+
+
+def get_applied_migrations(mydb, cursor):
+    cursor.execute('CREATE TABLE IF NOT EXISTS schemaMigrations (name VARCHAR(255) NOT NULL PRIMARY KEY, appliedTime INT NOT NULL)')
+    mydb.commit()
+    cursor.execute('SELECT name FROM schemaMigrations')
+    return {row['name'] for row in cursor.fetchall()}
+
+
+def run_sql_migration(mydb, cursor, path):
+    # statements are separated by ";" at the end of a line, lines starting with "--" are comments
+    with open(path, 'r') as f:
+        lines = [line for line in f.read().splitlines() if not line.strip().startswith('--')]
+    for statement in '\n'.join(lines).split(';\n'):
+        statement = statement.strip().rstrip(';')
+        if statement:
+            cursor.execute(statement)
+    mydb.commit()
+
+
+def run_py_migration(mydb, cursor, path):
+    # python migrations define migrate(mydb, cursor), used when the data has to be computed by the application (ex. slugs)
+    spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.migrate(mydb, cursor)
+    mydb.commit()
+
+
+if __name__ == '__main__':
+    migrations_dir = f'{working_dir}migrations'
+    mydb = flaskr.functions.connect_db()
+    cursor = mydb.cursor(dictionary=True)
+
+    applied = get_applied_migrations(mydb, cursor)
+    for name in sorted(os.listdir(migrations_dir)):
+        if (name in applied) or (not name.endswith(('.sql', '.py'))):
+            continue
+        print(f'Applying {name}')
+        start = time.time()
+        if name.endswith('.sql'):
+            run_sql_migration(mydb, cursor, f'{migrations_dir}/{name}')
+        else:
+            run_py_migration(mydb, cursor, f'{migrations_dir}/{name}')
+        cursor.execute('INSERT INTO schemaMigrations (name, appliedTime) VALUES (%s, %s)', (name, int(time.time())))
+        mydb.commit()
+        print(f'Applied {name} in {round(time.time() - start, 2)}s')
+
+    cursor.close()
+    mydb.close()
@@ -0,0 +1,23 @@
+# Copyright (c) 2025 Jakub Binkowski
+# Licensed under the Jakub Binkowski License (modified MIT-style)
+# For license terms, see: https://github.com/jkbbinkowski/flask-ecommerce-backend/blob/master/LICENSE
+
+import os
+import sys
+import dotenv
+import configparser
+
+
+dotenv.load_dotenv()
+working_dir = os.getenv('WORKING_DIR')
+config = configparser.ConfigParser()
+config.read(f'{working_dir}/config.ini')
+
+sys.path.append(working_dir)
+import flaskr.functions
+
+
+if __name__ == '__main__':
+    # run after changing categories or flaskr/json files, all running workers reload them without restart
+    payload = flaskr.functions.notify_static_data_changed()
+    print(f"Static data version bumped to {payload['version']}")